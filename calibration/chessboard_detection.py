@@ -0,0 +1,228 @@
+import argparse
+import collections
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Detection settings of the worker processes, set by the pool initializer
+_settings = None
+
+
+# Flags of the coarse search; CALIB_CB_FAST_CHECK rejects frames without a board quickly
+COARSE_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+
+def find_corners(gray, checkerboard, criteria, coarse_size=0):
+    """
+    Chessboard corners refined to sub-pixel accuracy, or None if no board was found.
+
+    coarse_size: if set, search on a copy downscaled to this longest side (with CALIB_CB_FAST_CHECK)
+                 and only refine the found corners at full resolution with cornerSubPix
+    """
+    scale = coarse_size / max(gray.shape) if coarse_size else 1.0
+    if scale >= 1.0:
+        ret, corners = cv2.findChessboardCorners(gray, checkerboard, None)
+    else:
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        ret, corners = cv2.findChessboardCorners(small, checkerboard, None, COARSE_FLAGS)
+        if ret:
+            # Pixel centers of the downscaled image -> full resolution
+            corners = (corners + 0.5) / scale - 0.5
+    if not ret:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+
+def _init_worker(settings):
+    global _settings
+    _settings = settings
+
+
+def _detect(frame_index, gray):
+    return frame_index, find_corners(gray, **_settings)
+
+
+def _seek(cap, time_s):
+    # Position the capture at time_s; returns the index of the next frame (0 if the backend cannot seek)
+    if time_s > 0 and cap.set(cv2.CAP_PROP_POS_MSEC, time_s * 1000.0):
+        return int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    return 0
+
+
+def read_gray_frames(input_video_path, stride=1, windows=None, stats=None):
+    """
+    (frame_index, grayscale frame) of every stride-th frame of the video.
+
+    windows: only frames within these (start, end) times in seconds; the stride counts from the
+             first frame of each window, and reading starts with a seek to the earliest window
+    stats:   DetectionStats that collects the read times of the kept and the skipped frames
+
+    Frame times are the container timestamps (CAP_PROP_POS_MSEC), so variable frame rate
+    videos are sampled correctly. Skipped frames are only grab()bed: the codec still decodes
+    them (later frames may reference them), but the conversion to BGR, the copy and cvtColor
+    are saved.
+    """
+    if stride < 1:
+        raise ValueError('stride must be at least 1, got {}'.format(stride))
+    windows = sorted(tuple(window) for window in windows) if windows else None
+    cap = cv2.VideoCapture(input_video_path)
+    frame_index = _seek(cap, windows[0][0]) if windows else 0
+    last_time = max(end for start, end in windows) if windows else None
+    # First frame index of every window seen so far (the whole video without windows)
+    first_index = {}
+    try:
+        while True:
+            start_time = time.perf_counter()
+            if not cap.grab():
+                break
+            t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if last_time is not None and t >= last_time:
+                break
+            window = next((w for w in windows if w[0] <= t < w[1]), None) if windows else ()
+            keep = False
+            if window is not None:
+                keep = (frame_index - first_index.setdefault(window, frame_index)) % stride == 0
+            if keep:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if stats is not None:
+                stats.add_read(time.perf_counter() - start_time, keep)
+            if keep:
+                yield frame_index, gray
+            frame_index += 1
+    finally:
+        cap.release()
+
+
+class DetectionStats:
+
+    def __init__(self):
+        self.n_frames = 0
+        self.n_detections = 0
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        self.read_time = 0.0
+        self.n_skipped = 0
+        self.skip_time = 0.0
+
+    def add_read(self, seconds, kept=True):
+        if kept:
+            self.read_time += seconds
+        else:
+            self.n_skipped += 1
+            self.skip_time += seconds
+
+    def add(self, corners):
+        self.n_frames += 1
+        self.n_detections += corners is not None
+        self.elapsed = time.perf_counter() - self.start
+
+    def conversion_time_saved(self):
+        # Estimate: the skipped frames at the read time of a kept frame, minus the time of their grab()s
+        # (grab() still decodes, only the retrieve() conversion and cvtColor are saved)
+        if not self.n_frames:
+            return 0.0
+        return self.n_skipped * self.read_time / self.n_frames - self.skip_time
+
+    def __str__(self):
+        elapsed = max(self.elapsed, 1e-9)
+        text = '{} boards in {} frames in {:.1f} s ({:.1f} frames/s, {:.1f} detections/s)'.format(
+            self.n_detections, self.n_frames, self.elapsed, self.n_frames / elapsed, self.n_detections / elapsed)
+        if self.n_skipped:
+            text += ', {} frames skipped ({:.1f} s conversion time saved)'.format(self.n_skipped, self.conversion_time_saved())
+        return text
+
+
+def detect_chessboards(input_video_path, checkerboard, criteria, n_workers=None, max_pending=None, stats=None, coarse_size=0, stride=1, windows=None):
+    """
+    Chessboard detection on every frame of a video, distributed over a process pool.
+
+    Yields (frame_index, gray, corners) in frame order; corners is None for frames without a board.
+    At most max_pending frames (default: 4 per worker) are in flight, so long videos are not
+    decoded into memory ahead of the workers. Pass a DetectionStats to collect the throughput.
+    coarse_size enables the coarse-to-fine search of find_corners; stride and windows
+    sample the frames (see read_gray_frames).
+    """
+    n_workers = n_workers or os.cpu_count()
+    max_pending = max_pending or 4 * n_workers
+    settings = dict( checkerboard=checkerboard, criteria=criteria, coarse_size=coarse_size )
+    with multiprocessing.Pool(n_workers, initializer=_init_worker, initargs=(settings,)) as pool:
+        pending = collections.deque()
+
+        def collect():
+            gray, result = pending.popleft()
+            frame_index, corners = result.get()
+            if stats is not None:
+                stats.add(corners)
+            return frame_index, gray, corners
+
+        for frame_index, gray in read_gray_frames(input_video_path, stride, windows, stats):
+            pending.append((gray, pool.apply_async(_detect, (frame_index, gray))))
+            if len(pending) >= max_pending:
+                yield collect()
+        while pending:
+            yield collect()
+
+
+def object_points(checkerboard, square_size):
+    # Board corners in board coordinates (z = 0), scaled by the square size
+    objp = np.zeros((checkerboard[0] * checkerboard[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:checkerboard[0], 0:checkerboard[1]].T.reshape(-1, 2) * square_size
+    return objp
+
+
+def compare_search(input_video_path, checkerboard, criteria, square_size, coarse_size, max_frames=0):
+    # Full-resolution vs coarse-to-fine search on the same frames (single process): runtime,
+    # detections, corner differences and the reprojection error of calibrateCamera.
+    # Frames are streamed, both searches run on each frame and only the corners are kept
+    methods = (('full', 0), ('coarse', coarse_size))
+    results = {name: [] for name, size in methods}
+    elapsed = {name: 0.0 for name, size in methods}
+    image_size = None
+    n_frames = 0
+    for frame_index, gray in read_gray_frames(input_video_path):
+        if max_frames and frame_index >= max_frames:
+            break
+        image_size = gray.shape[::-1]
+        n_frames += 1
+        for name, size in methods:
+            start = time.perf_counter()
+            results[name].append(find_corners(gray, checkerboard, criteria, size))
+            elapsed[name] += time.perf_counter() - start
+    if not n_frames:
+        raise OSError('Could not read any frame from {}'.format(input_video_path))
+
+    objp = object_points(checkerboard, square_size)
+    for name, size in methods:
+        imgpoints = [c for c in results[name] if c is not None]
+        rms = cv2.calibrateCamera([objp] * len(imgpoints), imgpoints, image_size, None, None)[0] if imgpoints else float('nan')
+        print('{:<6} {:3d} boards in {} frames, {:6.1f} ms/frame, RMS reprojection error {:.4f} px'.format(
+            name, len(imgpoints), n_frames, elapsed[name] / n_frames * 1000, rms))
+
+    both = [(a, b) for a, b in zip(results['full'], results['coarse']) if a is not None and b is not None]
+    if both:
+        difference = np.concatenate([np.linalg.norm(a - b, axis=-1).ravel() for a, b in both])
+        print('Corner difference on {} common boards: mean {:.4f} px, max {:.4f} px'.format(len(both), difference.mean(), difference.max()))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the full-resolution and the coarse-to-fine chessboard search on a calibration video.')
+    parser.add_argument('input', help='calibration video')
+    parser.add_argument('--checkerboard', type=int, nargs=2, default=(6, 9), metavar=('COLUMNS', 'ROWS'), help='inner corners')
+    parser.add_argument('--square-size', type=float, default=9.6)
+    parser.add_argument('--coarse-size', type=int, default=960, help='longest side of the downscaled search image')
+    parser.add_argument('--max-frames', type=int, default=0)
+    args = parser.parse_args()
+
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+    try:
+        compare_search(args.input, tuple(args.checkerboard), criteria, args.square_size, args.coarse_size, args.max_frames)
+    except OSError as e:
+        print('Error: {}'.format(e))
+        raise SystemExit(1)
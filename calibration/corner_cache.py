@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from chessboard_detection import detect_chessboards
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'PoseTracking', 'corners')
+
+
+# Content hash of each video file seen by this process, keyed by (path, size, mtime)
+_hashes = {}
+
+
+def video_hash(video_path, block_size=1 << 20):
+    # Same key as mediaPipe/landmark_cache.py (the script folders do not import each other)
+    stat = os.stat(video_path)
+    memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hashes:
+        h = hashlib.sha1()
+        with open(video_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                h.update(block)
+        _hashes[memo_key] = h.hexdigest()
+    return _hashes[memo_key]
+
+
+def entry_path(cache_dir, video_path, checkerboard, criteria, coarse_size=0, stride=1, windows=None):
+    # One cache entry per (video content, checkerboard, cornerSubPix criteria, coarse search size, frame sampling);
+    # square_size and the calibration flags do not change the detected corners
+    settings = json.dumps(dict( checkerboard=list(checkerboard), criteria=list(criteria), coarse_size=coarse_size,
+                                stride=stride, windows=sorted([float(start), float(end)] for start, end in windows or []) ), sort_keys=True)
+    key = hashlib.sha1((video_hash(video_path) + settings).encode()).hexdigest()
+    return os.path.join(cache_dir, key + '.npz')
+
+
+def load(entry):
+    # Returns (image_size, n_frames, {frame_index: corners}), or None on a cache miss
+    if not os.path.isfile(entry):
+        return None
+    with np.load(entry) as data:
+        detections = dict(zip(data['frame_indices'].tolist(), data['corners']))
+        return tuple(data['image_size'].tolist()), int(data['n_frames']), detections
+
+
+def save(entry, image_size, n_frames, detections):
+    # Only the frames with a board: frame indices (K,) and corners (K, N, 1, 2) as float32
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    frame_indices = np.array(sorted(detections), np.int32)
+    corners = np.array([detections[i] for i in frame_indices], np.float32)
+    # np.savez appends .npz to other names, so the temporary file ends in .npz too; os.replace makes it the entry
+    tmp_path = '{}.tmp{}.npz'.format(entry[:-len('.npz')], os.getpid())
+    np.savez_compressed(tmp_path, image_size=np.array(image_size), n_frames=n_frames, frame_indices=frame_indices, corners=corners)
+    os.replace(tmp_path, entry)
+
+
+def cached_chessboards(input_video_path, checkerboard, criteria, cache_dir=None, on_frame=None, **detect_options):
+    """
+    Chessboard corners of a video: (image_size, n_frames, {frame_index: corners}) for the frames with a board
+    (n_frames: number of frames searched).
+
+    With cache_dir, the detections are looked up in (or stored to) the corner cache and a
+    hit does not decode the video at all. On a miss, detect_chessboards runs with detect_options
+    and on_frame(frame_index, gray, corners) is called for every decoded frame (e.g. for a preview).
+    """
+    entry = None
+    if cache_dir is not None:
+        entry = entry_path(cache_dir, input_video_path, checkerboard, criteria, detect_options.get('coarse_size', 0),
+                           detect_options.get('stride', 1), detect_options.get('windows'))
+        cached = load(entry)
+        if cached is not None:
+            return cached
+
+    image_size, n_frames, detections = None, 0, {}
+    for frame_index, gray, corners in detect_chessboards(input_video_path, checkerboard, criteria, **detect_options):
+        image_size = gray.shape[::-1]
+        n_frames += 1
+        if corners is not None:
+            # (N, 1, 2) as with OpenCV 4, whatever layout findChessboardCorners returns
+            detections[frame_index] = corners.reshape(-1, 1, 2)
+        if on_frame is not None:
+            on_frame(frame_index, gray, corners)
+
+    # Nothing to store if no frame could be read (image_size unknown)
+    if entry is not None and image_size is not None:
+        save(entry, image_size, n_frames, detections)
+    return image_size, n_frames, detections
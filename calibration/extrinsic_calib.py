@@ -1,13 +1,11 @@
+import argparse
+import os
+
 import cv2
 import numpy as np
 
-# Load intrinsic parameters
-calib_file_path_1 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/calibration/calibration_output_camera1.npz'
-calib_file_path_2 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/calibration/calibration_output_camera2.npz'
-with np.load(calib_file_path_1) as X:
-    mtx1, dist1 = [X[i] for i in ('mtx', 'dist')]
-with np.load(calib_file_path_2) as X:
-    mtx2, dist2 = [X[i] for i in ('mtx', 'dist')]
+import corner_cache
+from chessboard_detection import DetectionStats, object_points
 
 # Checkerboard dimensions
 CHECKERBOARD = (6, 9)  # Adjust based on your checkerboard
@@ -16,101 +14,131 @@ square_size = 9.6  # Checker size in centimeters
 # Termination criteria for corner refinement
 criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-# Prepare object points
-objp = np.zeros((CHECKERBOARD[0] * CHECKERBOARD[1], 3), np.float32)
-objp[:, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2) * square_size
-
-# Arrays to store object points and image points from all images
-objpoints = []  # 3d points in real world space
-imgpoints1 = []  # 2d points in image plane from camera 1
-imgpoints2 = []  # 2d points in image plane from camera 2
-
-# Open both videos
-input_video_path_1 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/extrinsic_1.mp4' 
-input_video_path_2 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/extrinsic_2.mp4' 
-cap1 = cv2.VideoCapture(input_video_path_1)
-cap2 = cv2.VideoCapture(input_video_path_2)
-
-while True:
-    # Read frames from both videos
-    ret1, frame1 = cap1.read()
-    ret2, frame2 = cap2.read()
-
-    # Break out of the loop if at least one frame is not read correctly
-    if not ret1 or not ret2:
-        break
-
-    gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
-
-    # Find the chess board corners
-    ret1, corners1 = cv2.findChessboardCorners(gray1, CHECKERBOARD, None)
-    ret2, corners2 = cv2.findChessboardCorners(gray2, CHECKERBOARD, None)
-
-    # If found in both images, add object points, image points
-    if ret1 and ret2:
-        objpoints.append(objp)
-
-        # Refining pixel coordinates for given 2d points.
-        corners1 = cv2.cornerSubPix(gray1, corners1, (11, 11), (-1, -1), criteria)
-        imgpoints1.append(corners1)
-
-        corners2 = cv2.cornerSubPix(gray2, corners2, (11, 11), (-1, -1), criteria)
-        imgpoints2.append(corners2)
-
-# Extrinsic calibration
-retval, cameraMatrix1, distCoeffs1, cameraMatrix2, distCoeffs2, R, T, E, F = cv2.stereoCalibrate(
-    objpoints, imgpoints1, imgpoints2, mtx1, dist1, mtx2, dist2, gray1.shape[::-1],
-    criteria=criteria, flags=cv2.CALIB_FIX_INTRINSIC
-)
-
-# Print rotation and translation matrices
-print("Rotation Matrix (R):\n", R)
-print("Translation Vector (T):\n", T)
-
-# Save the extrinsic parameters
-np.savez('extrinsic_params.npz', R=R, T=T, E=E, F=F)
-
-# Stereo Rectification
-R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(
-    mtx1, dist1, mtx2, dist2, gray1.shape[::-1], R, T, alpha=1
-)
-np.savez('stereo_rectify_params.npz', R1=R1, R2=R2, P1=P1, P2=P2, Q=Q)
-
-# Display rectified images (Optional, for verification)
-map1_x, map1_y = cv2.initUndistortRectifyMap(mtx1, dist1, R1, P1, gray1.shape[::-1], cv2.CV_32FC1)
-map2_x, map2_y = cv2.initUndistortRectifyMap(mtx2, dist2, R2, P2, gray2.shape[::-1], cv2.CV_32FC1)
-
-cap1 = cv2.VideoCapture(input_video_path_1)
-cap2 = cv2.VideoCapture(input_video_path_2)
-
-while True:
-    ret1, frame1 = cap1.read()
-    ret2, frame2 = cap2.read()
-    
-    if not ret1 or not ret2:
-        break
-    
-    rectified1 = cv2.remap(frame1, map1_x, map1_y, cv2.INTER_LINEAR)
-    rectified2 = cv2.remap(frame2, map2_x, map2_y, cv2.INTER_LINEAR)
-
-    cv2.imshow('Rectified Camera 1', rectified1)
-    cv2.imshow('Rectified Camera 2', rectified2)
-    
-    # Press ‘q’ to close the rectified video windows
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap1.release()
-cap2.release()
-cv2.destroyAllWindows()
-
-# Verification: Calculate and print reprojection error
-total_error = 0
-for i in range(len(objpoints)):
-    imgpoints1_proj, _ = cv2.projectPoints(objpoints[i], R, T, mtx1, dist1)
-    imgpoints2_proj, _ = cv2.projectPoints(objpoints[i], np.eye(3), np.zeros((3, 1)), mtx2, dist2)
-    error1 = cv2.norm(imgpoints1[i], imgpoints1_proj, cv2.NORM_L2) / len(imgpoints1_proj)
-    error2 = cv2.norm(imgpoints2[i], imgpoints2_proj, cv2.NORM_L2) / len(imgpoints2_proj)
-    total_error += error1 + error2
-print("Reprojection Error:", total_error / len(objpoints)) # Goal: reprojection error < 0.5 pixels
\ No newline at end of file
+
+if __name__ == '__main__':
+    calib_file_path_1 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/calibration/calibration_output_camera1.npz'
+    calib_file_path_2 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/calibration/calibration_output_camera2.npz'
+    input_video_path_1 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/extrinsic_1.mp4'
+    input_video_path_2 = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/extrinsic_2.mp4'
+
+    parser = argparse.ArgumentParser(description='Extrinsic (stereo) calibration from two synchronized chessboard videos.')
+    parser.add_argument('input1', nargs='?', default=input_video_path_1, help='video of camera 1')
+    parser.add_argument('input2', nargs='?', default=input_video_path_2, help='video of camera 2')
+    parser.add_argument('--calib1', default=calib_file_path_1, help='intrinsic calibration of camera 1')
+    parser.add_argument('--calib2', default=calib_file_path_2, help='intrinsic calibration of camera 2')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='chessboard detection processes (default: all cores)')
+    parser.add_argument('--coarse-size', type=int, default=0, metavar='PX',
+                        help='search the chessboard on frames downscaled to PX (longest side) and refine at full resolution (e.g. 960)')
+    parser.add_argument('--stride', type=int, default=1, metavar='N', help='only search every Nth frame (the others are grabbed, not decoded to images)')
+    parser.add_argument('--window', type=float, nargs=2, action='append', metavar=('START', 'END'),
+                        help='only search frames between START and END seconds (repeatable)')
+    parser.add_argument('--cache-dir', nargs='?', const=corner_cache.DEFAULT_CACHE_DIR, metavar='DIR',
+                        help='reuse the corners of earlier runs with the same videos, checkerboard and criteria (default DIR: %(const)s)')
+    parser.add_argument('--headless', action='store_true', help='do not show the rectified videos')
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error('--stride must be at least 1')
+    if any(start >= end for start, end in args.window or []):
+        parser.error('--window START must be before END')
+
+    # Load intrinsic parameters
+    with np.load(args.calib1) as X:
+        mtx1, dist1 = [X[i] for i in ('mtx', 'dist')]
+    with np.load(args.calib2) as X:
+        mtx2, dist2 = [X[i] for i in ('mtx', 'dist')]
+
+    # Find the chess board corners in all frames of both videos (in parallel, or from the corner cache)
+    detections = []
+    image_sizes = []
+    for input_video_path in (args.input1, args.input2):
+        stats = DetectionStats()
+        image_size, n_frames, found = corner_cache.cached_chessboards(
+            input_video_path, CHECKERBOARD, criteria, args.cache_dir,
+            n_workers=args.workers, stats=stats, coarse_size=args.coarse_size,
+            stride=args.stride, windows=args.window)
+        if stats.n_frames:
+            print('Chessboard detection ({}): {}'.format(input_video_path, stats))
+        else:
+            print('Chessboard detection ({}): {} boards in {} frames (cached)'.format(input_video_path, len(found), n_frames))
+        if image_size is None:
+            print("Error: Could not read any frame from {}.".format(input_video_path))
+            raise SystemExit(1)
+        detections.append(found)
+        image_sizes.append(image_size)
+    size1, size2 = image_sizes
+
+    # stereoCalibrate and stereoRectify take one image size for both cameras
+    if size1 != size2:
+        print("Error: The videos have different frame sizes ({}x{} and {}x{}).".format(*size1, *size2))
+        raise SystemExit(1)
+
+    # Only frames with the board found in both videos
+    common = sorted(set(detections[0]) & set(detections[1]))
+    if not common:
+        print("Error: No chessboard found in the same frame of both videos.")
+        raise SystemExit(1)
+
+    # Arrays to store object points and image points from all images
+    objp = object_points(CHECKERBOARD, square_size)
+    objpoints = [objp] * len(common)  # 3d points in real world space
+    imgpoints1 = [detections[0][i] for i in common]  # 2d points in image plane from camera 1
+    imgpoints2 = [detections[1][i] for i in common]  # 2d points in image plane from camera 2
+
+    # Extrinsic calibration
+    retval, cameraMatrix1, distCoeffs1, cameraMatrix2, distCoeffs2, R, T, E, F = cv2.stereoCalibrate(
+        objpoints, imgpoints1, imgpoints2, mtx1, dist1, mtx2, dist2, size1,
+        criteria=criteria, flags=cv2.CALIB_FIX_INTRINSIC
+    )
+
+    # Print rotation and translation matrices
+    print("Rotation Matrix (R):\n", R)
+    print("Translation Vector (T):\n", T)
+
+    # Save the extrinsic parameters
+    np.savez('extrinsic_params.npz', R=R, T=T, E=E, F=F)
+
+    # Stereo Rectification
+    R1, R2, P1, P2, Q, _, _ = cv2.stereoRectify(
+        mtx1, dist1, mtx2, dist2, size1, R, T, alpha=1
+    )
+    np.savez('stereo_rectify_params.npz', R1=R1, R2=R2, P1=P1, P2=P2, Q=Q)
+
+    # Rectification maps
+    map1_x, map1_y = cv2.initUndistortRectifyMap(mtx1, dist1, R1, P1, size1, cv2.CV_32FC1)
+    map2_x, map2_y = cv2.initUndistortRectifyMap(mtx2, dist2, R2, P2, size2, cv2.CV_32FC1)
+
+    # Display rectified images (Optional, for verification)
+    if not args.headless:
+        cap1 = cv2.VideoCapture(args.input1)
+        cap2 = cv2.VideoCapture(args.input2)
+
+        while True:
+            ret1, frame1 = cap1.read()
+            ret2, frame2 = cap2.read()
+
+            if not ret1 or not ret2:
+                break
+
+            rectified1 = cv2.remap(frame1, map1_x, map1_y, cv2.INTER_LINEAR)
+            rectified2 = cv2.remap(frame2, map2_x, map2_y, cv2.INTER_LINEAR)
+
+            cv2.imshow('Rectified Camera 1', rectified1)
+            cv2.imshow('Rectified Camera 2', rectified2)
+
+            # Press ‘q’ to close the rectified video windows
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+        cap1.release()
+        cap2.release()
+        cv2.destroyAllWindows()
+
+    # Verification: Calculate and print reprojection error
+    total_error = 0
+    for i in range(len(objpoints)):
+        imgpoints1_proj, _ = cv2.projectPoints(objpoints[i], R, T, mtx1, dist1)
+        imgpoints2_proj, _ = cv2.projectPoints(objpoints[i], np.eye(3), np.zeros((3, 1)), mtx2, dist2)
+        error1 = cv2.norm(imgpoints1[i], imgpoints1_proj, cv2.NORM_L2) / len(imgpoints1_proj)
+        error2 = cv2.norm(imgpoints2[i], imgpoints2_proj, cv2.NORM_L2) / len(imgpoints2_proj)
+        total_error += error1 + error2
+    print("Reprojection Error:", total_error / len(objpoints)) # Goal: reprojection error < 0.5 pixels
@@ -1,6 +1,13 @@
+import argparse
+import os
+import time
+
 import numpy as np
 import cv2
-import glob
+
+import corner_cache
+from chessboard_detection import DetectionStats, object_points
+from view_selection import coverage, select_views
 
 # Checkerboard dimensions
 CHECKERBOARD = (6,9)  # Number of inner corners
@@ -9,72 +16,110 @@ square_size = 9.6  # Checker size in centimeters
 # Termination criteria for corner refinement: 30 iterations, 0.001 pixels
 criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-# Prepare object points by scaling by square_size
-objp = np.zeros((CHECKERBOARD[0] * CHECKERBOARD[1], 3), np.float32)
-objp[:, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2) * square_size
-
-# Arrays to store object points and image points
-objpoints = []  # 3d points in real world space
-imgpoints = []  # 2d points in image plane
 
-# Capture video -> Change to 'intrinsic_2.mp4' for the second camera
-input_video_path = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/intrinsic_1.mp4' 
-cap = cv2.VideoCapture(input_video_path)  
+if __name__ == '__main__':
+    # Capture video -> Change to 'intrinsic_2.mp4' for the second camera
+    input_video_path = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/videos/intrinsic_1.mp4'
+
+    parser = argparse.ArgumentParser(description='Intrinsic camera calibration from a chessboard video.')
+    parser.add_argument('input', nargs='?', default=input_video_path, help='calibration video')
+    parser.add_argument('--output', default='calibration_output_camera1.npz', help='calibration result (CHANGE INDEX for the second camera!)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='chessboard detection processes (default: all cores)')
+    parser.add_argument('--coarse-size', type=int, default=0, metavar='PX',
+                        help='search the chessboard on frames downscaled to PX (longest side) and refine at full resolution (e.g. 960)')
+    parser.add_argument('--stride', type=int, default=1, metavar='N', help='only search every Nth frame (the others are grabbed, not decoded to images)')
+    parser.add_argument('--window', type=float, nargs=2, action='append', metavar=('START', 'END'),
+                        help='only search frames between START and END seconds (repeatable)')
+    parser.add_argument('--cache-dir', nargs='?', const=corner_cache.DEFAULT_CACHE_DIR, metavar='DIR',
+                        help='reuse the corners of earlier runs with the same video, checkerboard and criteria (default DIR: %(const)s)')
+    parser.add_argument('--max-views', type=int, default=0, metavar='N',
+                        help='calibrate on at most N views, selected for diverse board position, scale and tilt (e.g. 40; default: all)')
+    parser.add_argument('--headless', action='store_true', help='do not show the detected corners and the undistorted frame')
+    args = parser.parse_args()
+    if args.stride < 1:
+        parser.error('--stride must be at least 1')
+    if any(start >= end for start, end in args.window or []):
+        parser.error('--window START must be before END')
+
+    # Prepare object points by scaling by square_size
+    objp = object_points(CHECKERBOARD, square_size)
+
+    # Find the chess board corners in all frames (in parallel, or from the corner cache)
+    stats = DetectionStats()
+
+    def show_corners(frame_index, gray, corners):
+        # Draw and display the corners
+        if corners is not None and not args.headless:
+            frame = cv2.drawChessboardCorners(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), CHECKERBOARD, corners, True)
+            cv2.imshow('Frame', frame)
+            cv2.waitKey(1)
+
+    image_size, n_frames, detections = corner_cache.cached_chessboards(
+        args.input, CHECKERBOARD, criteria, args.cache_dir, on_frame=show_corners,
+        n_workers=args.workers, stats=stats, coarse_size=args.coarse_size,
+        stride=args.stride, windows=args.window)
+    if stats.n_frames:
+        print('Chessboard detection: {}'.format(stats))
+    else:
+        print('Chessboard detection: {} boards in {} frames (cached)'.format(len(detections), n_frames))
+        if not args.headless:
+            # A cache hit does not decode the video, so there are no frames to draw the corners on
+            print('Corner preview skipped (cached corners)')
+
+    if not detections:
+        print("Error: No chessboard found in {}.".format(args.input))
+        raise SystemExit(1)
+
+    # Arrays to store object points and image points
+    imgpoints = list(detections.values())  # 2d points in image plane
+    objpoints = [objp] * len(imgpoints)  # 3d points in real world space
+
+    # Keep a diverse subset of the views: near-duplicate frames add solve time, not information
+    if args.max_views:
+        all_coverage = coverage(imgpoints, image_size)
+        selected = select_views(imgpoints, CHECKERBOARD, image_size, args.max_views)
+        objpoints = [objpoints[i] for i in selected]
+        imgpoints = [imgpoints[i] for i in selected]
+        print('Selected {} views, image coverage {:.0%} (all views: {:.0%})'.format(len(selected), coverage(imgpoints, image_size), all_coverage))
+    else:
+        print('Image coverage of {} views: {:.0%}'.format(len(imgpoints), coverage(imgpoints, image_size)))
+
+    # Calibration
+    start = time.perf_counter()
+    ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
+    print('RMS reprojection error: {:.3f} px (calibrateCamera: {:.2f} s)'.format(ret, time.perf_counter() - start))
+
+    # Save the calibration results -> CHANGE INDEX!
+    np.savez(args.output, mtx=mtx, dist=dist, rvecs=rvecs, tvecs=tvecs)
+
+    # Verify the calibration by undistorting an image
+    # Read an image from the video or capture a new frame
+    cap = cv2.VideoCapture(args.input)
+    ret, frame = cap.read()  # Read a single frame
 
-while cap.isOpened():
-    ret, frame = cap.read()
     if not ret:
-        break
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-    # Find the chess board corners
-    ret, corners = cv2.findChessboardCorners(gray, CHECKERBOARD, None)
-
-    # If found, add object points, image points
-    if ret == True:
-        objpoints.append(objp)
-
-        corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
-        imgpoints.append(corners2)
-
-        # Draw and display the corners
-        frame = cv2.drawChessboardCorners(frame, CHECKERBOARD, corners2, ret)
-        cv2.imshow('Frame', frame)
-        cv2.waitKey(1)
-
-# Calibration
-ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
-
-# Save the calibration results -> CHANGE INDEX!
-np.savez('calibration_output_camera1.npz', mtx=mtx, dist=dist, rvecs=rvecs, tvecs=tvecs)
-
-# Verify the calibration by undistorting an image
-# Read an image from the video or capture a new frame
-cap = cv2.VideoCapture(input_video_path)
-ret, frame = cap.read()  # Read a single frame
-
-if ret:
-    h, w = frame.shape[:2]
-    # Compute the optimal new camera matrix
-    new_camera_mtx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
-
-    # Undistort the image
-    undistorted_frame = cv2.undistort(frame, mtx, dist, None, new_camera_mtx)
-
-    # Crop the image if necessary
-    x, y, w, h = roi
-    undistorted_frame = undistorted_frame[y:y+h, x:x+w]
-
-    # Display the original and undistorted images
-    cv2.imshow('Original Frame', frame)
-    cv2.imshow('Undistorted Frame', undistorted_frame)
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
-else:
-    print("Error: Could not read frame from video.")
-
-# Clean-up
-cap.release()
-cv2.destroyAllWindows()
-
-print("Calibration is done. Camera matrix and distortion coefficients are saved.")
+        print("Error: Could not read frame from video.")
+    elif not args.headless:
+        h, w = frame.shape[:2]
+        # Compute the optimal new camera matrix
+        new_camera_mtx, roi = cv2.getOptimalNewCameraMatrix(mtx, dist, (w, h), 1, (w, h))
+
+        # Undistort the image
+        undistorted_frame = cv2.undistort(frame, mtx, dist, None, new_camera_mtx)
+
+        # Crop the image if necessary
+        x, y, w, h = roi
+        undistorted_frame = undistorted_frame[y:y+h, x:x+w]
+
+        # Display the original and undistorted images
+        cv2.imshow('Original Frame', frame)
+        cv2.imshow('Undistorted Frame', undistorted_frame)
+        cv2.waitKey(0)
+        cv2.destroyAllWindows()
+
+    # Clean-up
+    cap.release()
+    if not args.headless:
+        cv2.destroyAllWindows()
+
+    print("Calibration is done. Camera matrix and distortion coefficients are saved.")
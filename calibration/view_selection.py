@@ -0,0 +1,73 @@
+import numpy as np
+
+
+def board_features(corners, checkerboard, image_size):
+    """
+    Pose descriptor of one detected board: (x, y, scale, tilt_x, tilt_y).
+
+    x, y:           board center, normalized by the image size
+    scale:          sqrt of the board area relative to the image area
+    tilt_x, tilt_y: log ratio of opposite board edges (0 for a board facing the camera)
+    """
+    width, height = image_size
+    points = corners.reshape(checkerboard[1], checkerboard[0], 2)
+    top_left, top_right, bottom_left, bottom_right = points[0, 0], points[0, -1], points[-1, 0], points[-1, -1]
+    quad = np.array([top_left, top_right, bottom_right, bottom_left], np.float64)
+
+    x, y = quad.mean(axis=0) / (width, height)
+    # Shoelace formula for the area of the outer corner quadrilateral
+    area = 0.5 * abs(np.dot(quad[:, 0], np.roll(quad[:, 1], 1)) - np.dot(quad[:, 1], np.roll(quad[:, 0], 1)))
+    scale = np.sqrt(area / (width * height))
+    tilt_x = np.log(np.linalg.norm(bottom_left - top_left) / np.linalg.norm(bottom_right - top_right))
+    tilt_y = np.log(np.linalg.norm(top_right - top_left) / np.linalg.norm(bottom_right - bottom_left))
+    return np.array([x, y, scale, tilt_x, tilt_y])
+
+
+def coverage(corners_list, image_size, grid=(8, 6)):
+    # Fraction of the cells of a grid over the image that contain at least one corner
+    width, height = image_size
+    covered = np.zeros(grid[::-1], bool)
+    for corners in corners_list:
+        points = corners.reshape(-1, 2)
+        cx = np.clip((points[:, 0] / width * grid[0]).astype(int), 0, grid[0] - 1)
+        cy = np.clip((points[:, 1] / height * grid[1]).astype(int), 0, grid[1] - 1)
+        covered[cy, cx] = True
+    return float(covered.mean())
+
+
+def select_views(corners_list, checkerboard, image_size, max_views=40, position_bins=(4, 3), scale_bins=3, tilt_bins=3, tilt_range=0.3):
+    """
+    Indices (into corners_list) of a diverse subset of at most max_views board views.
+
+    Views are binned by board position (position_bins grid), scale and tilt (tilt_bins per axis
+    over +-tilt_range); one view per occupied bin is kept (the middle one, in frame order). If
+    that is still more than max_views, the most different ones are picked by farthest-point
+    sampling on the pose features.
+    """
+    if not corners_list:
+        return []
+    features = np.array([board_features(corners, checkerboard, image_size) for corners in corners_list])
+
+    gx = np.clip((features[:, 0] * position_bins[0]).astype(int), 0, position_bins[0] - 1)
+    gy = np.clip((features[:, 1] * position_bins[1]).astype(int), 0, position_bins[1] - 1)
+    scale_edges = np.quantile(features[:, 2], np.linspace(0, 1, scale_bins + 1)[1:-1])
+    gs = np.searchsorted(scale_edges, features[:, 2])
+    tilt_edges = np.linspace(-tilt_range, tilt_range, tilt_bins + 1)[1:-1]
+    gtx = np.searchsorted(tilt_edges, features[:, 3])
+    gty = np.searchsorted(tilt_edges, features[:, 4])
+
+    bins = {}
+    for i, key in enumerate(zip(gx, gy, gs, gtx, gty)):
+        bins.setdefault(key, []).append(i)
+    candidates = np.array(sorted(members[len(members) // 2] for members in bins.values()))
+    if max_views <= 0 or len(candidates) <= max_views:
+        return candidates.tolist()
+
+    # Farthest-point sampling, starting with the largest board
+    normalized = (features[candidates] - features.mean(axis=0)) / (features.std(axis=0) + 1e-9)
+    chosen = [int(np.argmax(features[candidates, 2]))]
+    distance = np.linalg.norm(normalized - normalized[chosen[0]], axis=1)
+    while len(chosen) < max_views:
+        chosen.append(int(np.argmax(distance)))
+        distance = np.minimum(distance, np.linalg.norm(normalized - normalized[chosen[-1]], axis=1))
+    return sorted(candidates[chosen].tolist())
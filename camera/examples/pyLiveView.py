@@ -22,18 +22,22 @@ import platform
 
 StringIO = six.StringIO
 
-try:
-   import pygtk
-   import gtk
-   from gtk import gdk
-   import cairo
+# pyGTK is only imported with --gui (see import_gtk), headless runs start without it
+gtk = None
+gdk = None
+cairo = None
+
+def import_gtk():
+   global gtk, gdk, cairo
+   try:
+      import pygtk
+      import gtk
+      from gtk import gdk
+      import cairo
+   except ImportError:
+      return False
    gtk.gdk.threads_init()
-   _hasPyGTK = True
-except ImportError:
-   _hasPyGTK = False
-'''
-_hasPyGTK = False
-'''
+   return True
 
 # Global Variables
 options  = None
@@ -437,14 +441,16 @@ def Run():
 
    # Gui related
    parser.set_defaults(gui=None, autostart=None)
-   if _hasPyGTK:
-      parser.add_argument("-g", "--gui", action="store_true", dest="gui", default=None,
-              help="Display LiveView images using pyGTK GUI" )
-      parser.add_argument("-a", "--autostart", action="store_true", dest="autostart", default=None,
-              help="Automatically start capturing video (default if no GUI)" )
+   parser.add_argument("-g", "--gui", action="store_true", dest="gui", default=None,
+           help="Display LiveView images using pyGTK GUI (needs pyGTK)" )
+   parser.add_argument("-a", "--autostart", action="store_true", dest="autostart", default=None,
+           help="Automatically start capturing video (default if no GUI)" )
 
    options = parser.parse_args()
 
+   if options.gui and not import_gtk():
+      parser.error("--gui needs pyGTK (pygtk, gtk and cairo)")
+
    display = liveview_display()
 
    # capture Control C to close application
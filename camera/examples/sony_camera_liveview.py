@@ -4,16 +4,14 @@ from pysony import SonyAPI, ControlPoint
 
 import time
 
-flask_app = None
-try:
-    import flask
-    from flask import Flask
-    flask_app = Flask(__name__)
-except ImportError:
-    print("Cannot import `flask`, liveview on web is not available")
-
-if flask_app:
-    flask_app.get_frame_handle = None
+def create_flask_app(get_frame_handle):
+    # flask is only imported when the web liveview is started
+    try:
+        import flask
+    except ImportError:
+        print("Cannot import `flask`, liveview on web is not available")
+        return None
+    flask_app = flask.Flask(__name__)
 
     flask_app.config['DEBUG'] = False
 
@@ -33,15 +31,16 @@ if flask_app:
 
     def gen():
         while True:
-            if flask_app.get_frame_handle is not None:
-                frame = flask_app.get_frame_handle()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+            frame = get_frame_handle()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
     @flask_app.route('/video_feed')
     def video_feed():
         return flask.Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+    return flask_app
+
 
 def liveview():
     # Connect and set-up camera
@@ -75,6 +74,6 @@ def liveview():
 
 if __name__ == "__main__":
     handler = liveview()
+    flask_app = create_flask_app(handler)
     if flask_app:
-        flask_app.get_frame_handle = handler
         flask_app.run()
@@ -4,19 +4,23 @@ from pysony import SonyAPI, payload_header
 import time
 import shutil
 import os
-from flask import Flask, url_for
 
 from six.moves import urllib, _thread
 
-app = Flask(__name__)
-@app.route("/")
-def view():
-    return """<html>
-                <head>
-                    <meta http-equiv="refresh" content="1">
-                </head>
-                <img src="http://127.0.0.1:5000%s">
-               </html>""" % url_for('static', filename='live.jpg')
+def create_app():
+    # flask is only imported when the viewer is started
+    from flask import Flask, url_for
+
+    app = Flask(__name__)
+    @app.route("/")
+    def view():
+        return """<html>
+                    <head>
+                        <meta http-equiv="refresh" content="1">
+                    </head>
+                    <img src="http://127.0.0.1:5000%s">
+                   </html>""" % url_for('static', filename='live.jpg')
+    return app
 
 def liveview_and_save(timer=5):
     camera = SonyAPI()
@@ -49,5 +53,6 @@ def liveview_and_save(timer=5):
 
 if __name__ == "__main__":
     _thread.start_new_thread(liveview_and_save, ())
+    app = create_app()
     if app:
         app.run()
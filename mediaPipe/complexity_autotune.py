@@ -0,0 +1,115 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from frame_skipping import KeyframeInterpolator
+from landmark_metrics import landmark_jitter
+from pose_engine import create_pose_engine
+from roi_tracking import RoiPose
+
+# Heaviest first: 2 for heavy, 1 for full, and 0 for light
+MODEL_COMPLEXITIES = (2, 1, 0)
+
+
+def read_frames(input_video_path, n_frames):
+    # BGR frames as decoded; the conversion is part of the benchmarked per-frame cost
+    cap = cv2.VideoCapture(input_video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = []
+    while len(frames) < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames, fps
+
+
+def benchmark_complexity(frames, fps, model_complexity, warmup=5, roi=None, skip=None):
+    # Fresh engine per complexity, so tracking state does not carry over.
+    # roi: RoiPose options, skip: KeyframeInterpolator options (as in the pose_settings of
+    # pose_vizualization_video.py), so the fps is the one of the configured inference path
+    engine = create_pose_engine(model_complexity=model_complexity, running_mode='image' if roi else 'video')
+    if roi:
+        roi_pose = RoiPose(engine, **roi)
+
+        def detect(frame, frame_index):
+            return roi_pose.detect(frame, frame_index * 1000.0 / (fps or 30.0))
+    else:
+        def detect(frame, frame_index):
+            return engine.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), frame_index * 1000.0 / (fps or 30.0))
+
+    for i, frame in enumerate(frames[:warmup]):
+        detect(frame, i)
+
+    landmarks = []
+    start = time.perf_counter()
+    if skip:
+        interpolator = KeyframeInterpolator(lambda frame, i: detect(frame, i + warmup), **skip)
+        for frame in frames:
+            landmarks.extend(result for _, result in interpolator.push(frame))
+        landmarks.extend(result for _, result in interpolator.flush())
+    else:
+        for i, frame in enumerate(frames):
+            landmarks.append(detect(frame, i + warmup))
+    elapsed = time.perf_counter() - start
+    engine.close()
+
+    landmarks = np.array(landmarks)
+    frame_height, frame_width = frames[0].shape[:2]
+    jitter = landmark_jitter(landmarks, frame_width, frame_height)
+    return {
+        'model_complexity': model_complexity,
+        'fps': len(frames) / elapsed,
+        # None (JSON null) if no landmark was visible in three consecutive frames
+        'jitter_px': None if np.isnan(jitter) else jitter,
+        'detection_rate': float(np.mean(~np.isnan(landmarks[:, 0, 0]))),
+    }
+
+
+def autotune_complexity(input_video_path, target_fps, n_frames=60, complexities=MODEL_COMPLEXITIES, roi=None, skip=None):
+    """
+    Benchmark the model complexities on the first n_frames of the input and pick the heaviest
+    one that still reaches target_fps (the lightest one if none does). roi and skip benchmark
+    the ROI crop and keyframe inference of the actual run (see benchmark_complexity).
+
+    Returns (model_complexity, results) where results holds fps, jitter and detection rate per
+    complexity, meant to be stored in the output metadata.
+    """
+    frames, fps = read_frames(input_video_path, n_frames)
+    if not frames:
+        raise ValueError('Could not read frames from {}'.format(input_video_path))
+
+    results = [benchmark_complexity(frames, fps, model_complexity, roi=roi, skip=skip) for model_complexity in complexities]
+    fast_enough = [result for result in results if result['fps'] >= target_fps]
+    if fast_enough:
+        choice = max(fast_enough, key=lambda result: result['model_complexity'])
+    else:
+        choice = min(results, key=lambda result: result['model_complexity'])
+
+    autotune = {
+        'target_fps': target_fps,
+        'n_frames': len(frames),
+        'model_complexity': choice['model_complexity'],
+        'meets_target': bool(fast_enough),
+        'roi': roi,
+        'skip': skip,
+        'benchmark': results,
+    }
+    return choice['model_complexity'], autotune
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pick the heaviest MediaPipe Pose model that reaches a target frame rate.')
+    parser.add_argument('input', help='input video')
+    parser.add_argument('--target-fps', type=float, required=True)
+    parser.add_argument('--frames', type=int, default=60, help='number of frames to benchmark')
+    args = parser.parse_args()
+
+    model_complexity, autotune = autotune_complexity(args.input, args.target_fps, args.frames)
+    for result in autotune['benchmark']:
+        jitter = 'n/a' if result['jitter_px'] is None else '{:.2f} px'.format(result['jitter_px'])
+        print('model_complexity={model_complexity}: {fps:.1f} fps, jitter {}, detected in {detection_rate:.0%} of the frames'.format(jitter, **result))
+    print('Selected model_complexity={} ({})'.format(model_complexity, 'meets target' if autotune['meets_target'] else 'target not reached'))
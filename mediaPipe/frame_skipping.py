@@ -0,0 +1,169 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from pose_engine import create_pose_engine
+
+
+def interpolate_landmarks(start, end, t):
+    # Linear interpolation between two (33, 4) keyframe arrays; NaN if the pose is missing in either
+    return (1.0 - t) * start + t * end
+
+
+class KeyframeInterpolator:
+    """
+    Runs detect_fn only on keyframes and fills the frames in between by interpolation.
+
+    detect_fn:    detect_fn(frame, frame_index) -> (33, 4) landmark array
+    skip:         run detect_fn on every Kth frame
+    max_velocity: if set, fall back to every frame while a landmark moves faster than this
+                  (normalized image units per frame, e.g. 0.01 = 1% of the width per frame)
+
+    push(frame) returns the (frame, landmarks) pairs that are ready, which lags up to
+    skip - 1 frames behind; flush() returns the rest at the end of the video.
+    """
+
+    def __init__(self, detect_fn, skip=2, max_velocity=None, min_visibility=0.5):
+        self.detect_fn = detect_fn
+        self.skip = skip
+        self.max_velocity = max_velocity
+        self.min_visibility = min_visibility
+        self.step = 1
+        self.pending = []
+        self.keyframe = None
+        self.n_frames = 0
+        self.n_detections = 0
+
+    def _velocity(self, landmarks, n_frames):
+        # Fastest visible landmark between the last two keyframes
+        visible = (self.keyframe[:, 3] >= self.min_visibility) & (landmarks[:, 3] >= self.min_visibility)
+        if not visible.any():
+            return np.inf
+        displacement = np.linalg.norm(landmarks[visible, :2] - self.keyframe[visible, :2], axis=1)
+        return displacement.max() / n_frames
+
+    def _add_keyframe(self, frame):
+        landmarks = self.detect_fn(frame, self.n_frames - 1)
+        self.n_detections += 1
+        ready = []
+        n_gap = len(self.pending) + 1
+        for i, pending_frame in enumerate(self.pending):
+            ready.append((pending_frame, interpolate_landmarks(self.keyframe, landmarks, (i + 1) / n_gap)))
+        ready.append((frame, landmarks))
+
+        # Adapt the keyframe distance to the motion
+        if self.max_velocity is None:
+            self.step = self.skip
+        elif self.keyframe is not None:
+            fast = np.isnan(landmarks[0, 0]) or self._velocity(landmarks, n_gap) > self.max_velocity
+            self.step = 1 if fast else self.skip
+        self.keyframe = landmarks
+        self.pending = []
+        return ready
+
+    def push(self, frame):
+        self.n_frames += 1
+        if self.keyframe is None or len(self.pending) + 1 >= self.step:
+            return self._add_keyframe(frame)
+        self.pending.append(frame)
+        return []
+
+    def flush(self):
+        # The last held frame becomes a keyframe, so no frames are extrapolated
+        if not self.pending:
+            return []
+        frame = self.pending.pop()
+        return self._add_keyframe(frame)
+
+
+def interpolation_error(reference, interpolated, frame_width, frame_height, landmark_indices=None):
+    # Pixel error of interpolated landmarks against full-rate inference, over frames where both found a pose
+    if landmark_indices is not None:
+        reference, interpolated = reference[:, landmark_indices], interpolated[:, landmark_indices]
+    error = np.linalg.norm((reference[..., :2] - interpolated[..., :2]) * (frame_width, frame_height), axis=-1)
+    error = error[~np.isnan(error).any(axis=1)]
+    if error.size == 0:
+        return {'frames': 0}
+    return {
+        'frames': len(error),
+        'mean_px': float(error.mean()),
+        'p95_px': float(np.percentile(error, 95)),
+        'max_px': float(error.max()),
+    }
+
+
+def read_frames(input_video_path, max_frames=0):
+    # Frames of the video (the first max_frames), streamed so long clips are not held in memory
+    cap = cv2.VideoCapture(input_video_path)
+    n_frames = 0
+    try:
+        while not max_frames or n_frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            n_frames += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def validate(input_video_path, skip, max_velocity, model_complexity, max_frames=0):
+    # Run full-rate and keyframe inference on the same clip (decoded twice) and compare them
+    cap = cv2.VideoCapture(input_video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_width, frame_height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    def make_detector():
+        engine = create_pose_engine( model_complexity=model_complexity, min_detection_confidence=0.5, min_tracking_confidence=0.5 )
+        return lambda frame, frame_index: engine.detect(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), frame_index * 1000.0 / fps)
+
+    # Only the inference (and interpolation) is timed, not the decoding
+    detect = make_detector()
+    reference = []
+    full_rate_time = 0.0
+    for i, frame in enumerate(read_frames(input_video_path, max_frames)):
+        start = time.perf_counter()
+        reference.append(detect(frame, i))
+        full_rate_time += time.perf_counter() - start
+    if not reference:
+        raise OSError('Could not read any frame from {}'.format(input_video_path))
+    reference = np.array(reference)
+    n_frames = len(reference)
+
+    interpolator = KeyframeInterpolator(make_detector(), skip=skip, max_velocity=max_velocity)
+    pairs = []
+    skipped_time = 0.0
+    for frame in read_frames(input_video_path, n_frames):
+        start = time.perf_counter()
+        # Only the landmarks are kept, the frames are dropped as soon as they are interpolated
+        pairs.extend(landmarks for _, landmarks in interpolator.push(frame))
+        skipped_time += time.perf_counter() - start
+    start = time.perf_counter()
+    pairs.extend(landmarks for _, landmarks in interpolator.flush())
+    skipped_time += time.perf_counter() - start
+    interpolated = np.array(pairs)
+
+    print('Frames: {}, inference on {} ({:.0%})'.format(n_frames, interpolator.n_detections, interpolator.n_detections / n_frames))
+    print('Full rate: {:.1f} fps, keyframes: {:.1f} fps ({:.1f}x)'.format(
+        n_frames / full_rate_time, n_frames / skipped_time, full_rate_time / skipped_time))
+    print('Error, all landmarks: {}'.format(interpolation_error(reference, interpolated, frame_width, frame_height)))
+    print('Error, right arm:     {}'.format(interpolation_error(reference, interpolated, frame_width, frame_height, [12, 14, 16])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare keyframe inference with interpolation against full-rate inference on a validation clip.')
+    parser.add_argument('input', help='validation video')
+    parser.add_argument('--skip', type=int, default=3, help='run inference on every Kth frame')
+    parser.add_argument('--max-velocity', type=float, help='run inference on every frame while landmarks move faster (normalized units per frame)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2))
+    parser.add_argument('--max-frames', type=int, default=0, help='only use the first N frames of the clip')
+    args = parser.parse_args()
+
+    try:
+        validate(args.input, args.skip, args.max_velocity, args.model_complexity, args.max_frames)
+    except OSError as e:
+        print('Error: {}'.format(e))
+        raise SystemExit(1)
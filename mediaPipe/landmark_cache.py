@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+import shutil
+
+from landmark_sink import LandmarkSink, load_landmarks
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'PoseTracking', 'landmarks')
+
+
+# Hashes computed in this process, keyed by (path, size, mtime)
+_hashes = {}
+
+
+def video_hash(video_path, block_size=1 << 20):
+    # SHA-1 of the file content, so renamed or copied videos still hit the cache
+    stat = os.stat(video_path)
+    memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _hashes:
+        h = hashlib.sha1()
+        with open(video_path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                h.update(block)
+        _hashes[memo_key] = h.hexdigest()
+    return _hashes[memo_key]
+
+
+def entry_path(cache_dir, video_path, pose_settings, decoder='opencv'):
+    # One cache entry per (video content, model_complexity, min_detection_confidence, min_tracking_confidence, ...,
+    # decoder backend: the backends may differ in the decoded frames, e.g. in the orientation)
+    settings = json.dumps(dict(pose_settings or {}, decoder=decoder), sort_keys=True)
+    key = hashlib.sha1((video_hash(video_path) + settings).encode()).hexdigest()
+    return os.path.join(cache_dir, key)
+
+
+def has_entry(entry):
+    return os.path.isfile(os.path.join(entry, 'metadata.json'))
+
+
+def load(entry):
+    # Returns the cached (N, 33, 4) landmark array, or None on a cache miss
+    if not has_entry(entry):
+        return None
+    return load_landmarks(entry)[2]
+
+
+class CacheSink(LandmarkSink):
+    """
+    LandmarkSink that writes into a temporary directory and only becomes a cache entry
+    on commit(), so interrupted runs never leave incomplete entries behind.
+    """
+
+    def __init__(self, entry, metadata=None):
+        self.entry = entry
+        super().__init__('{}.tmp{}'.format(entry, os.getpid()), metadata=metadata)
+
+    def commit(self):
+        self.close()
+        try:
+            os.replace(self.path, self.entry)
+        except OSError:
+            # Another process committed the same entry first
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def discard(self):
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,12 @@
+import numpy as np
+
+
+def landmark_jitter(landmarks, frame_width, frame_height, min_visibility=0.5):
+    # Mean magnitude (pixels) of the second difference of visible landmarks: ~0 for smooth motion, large for jitter
+    xy = landmarks[..., :2] * (frame_width, frame_height)
+    xy[landmarks[..., 3] < min_visibility] = np.nan
+    if len(xy) < 3:
+        return float('nan')
+    acceleration = np.linalg.norm(xy[2:] - 2 * xy[1:-1] + xy[:-2], axis=-1)
+    acceleration = acceleration[~np.isnan(acceleration)]
+    return float(acceleration.mean()) if acceleration.size else float('nan')
@@ -0,0 +1,125 @@
+import json
+import os
+
+import numpy as np
+
+# MediaPipe Pose landmark count and per-landmark values (x, y, z, visibility)
+NUM_LANDMARKS = 33
+NUM_VALUES = 4
+
+# Fixed .npy header size, so the shape can be rewritten in place when the file is closed
+_HEADER_SIZE = 128
+
+
+def landmarks_to_array(pose_landmarks, out=None):
+    # Convert a NormalizedLandmarkList to a (33, 4) float32 array; NaN if no pose was detected.
+    # An unset visibility counts as visible (1.0), as in tasks_landmarks_to_array and drawing_utils
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, NUM_VALUES), np.float32)
+    if pose_landmarks is None:
+        out.fill(np.nan)
+        return out
+    for i, landmark in enumerate(pose_landmarks.landmark):
+        out[i] = (landmark.x, landmark.y, landmark.z, landmark.visibility if landmark.HasField('visibility') else 1.0)
+    return out
+
+
+def _npy_header(dtype, shape):
+    header = "{{'descr': '{}', 'fortran_order': False, 'shape': {}, }}".format(np.dtype(dtype).str, tuple(shape))
+    header = header.ljust(_HEADER_SIZE - 10 - 1) + '\n'
+    return b'\x93NUMPY\x01\x00' + np.uint16(len(header)).tobytes() + header.encode('latin1')
+
+
+class _NpyColumn:
+    # Append-only .npy file, the header is patched with the final length on close
+
+    def __init__(self, path, dtype, item_shape):
+        self.dtype = np.dtype(dtype)
+        self.item_shape = tuple(item_shape)
+        self.length = 0
+        self.file = open(path, 'wb')
+        self.file.write(_npy_header(self.dtype, (0,) + self.item_shape))
+
+    def write(self, values):
+        self.file.write(np.ascontiguousarray(values, self.dtype).tobytes())
+        self.length += len(values)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, (self.length,) + self.item_shape))
+        self.file.close()
+
+
+class LandmarkSink:
+    """
+    Streams per-frame pose landmarks to a directory of memory-mappable .npy columns:
+
+        frame_index.npy  (N,)        int64
+        timestamp.npy    (N,)        float64, seconds
+        landmarks.npy    (N, 33, 4)  float32, x/y/z/visibility, NaN where no pose was found
+        metadata.json    source video, fps, model settings, ...
+
+    Frames are collected in preallocated chunk buffers and written chunk by chunk.
+    """
+
+    def __init__(self, path, chunk_size=256, metadata=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.metadata = dict(metadata or {})
+        self.chunk_size = chunk_size
+        self.n_buffered = 0
+
+        self.frame_index = np.empty(chunk_size, np.int64)
+        self.timestamp = np.empty(chunk_size, np.float64)
+        self.landmarks = np.empty((chunk_size, NUM_LANDMARKS, NUM_VALUES), np.float32)
+
+        self.columns = {
+            'frame_index': _NpyColumn(os.path.join(path, 'frame_index.npy'), np.int64, ()),
+            'timestamp': _NpyColumn(os.path.join(path, 'timestamp.npy'), np.float64, ()),
+            'landmarks': _NpyColumn(os.path.join(path, 'landmarks.npy'), np.float32, (NUM_LANDMARKS, NUM_VALUES)),
+        }
+
+    def append(self, frame_index, timestamp, landmarks):
+        # landmarks: (33, 4) array, a NormalizedLandmarkList or None
+        i = self.n_buffered
+        self.frame_index[i] = frame_index
+        self.timestamp[i] = timestamp
+        if landmarks is None or isinstance(landmarks, np.ndarray):
+            self.landmarks[i] = np.nan if landmarks is None else landmarks
+        else:
+            landmarks_to_array(landmarks, out=self.landmarks[i])
+        self.n_buffered += 1
+        if self.n_buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        n = self.n_buffered
+        if n:
+            self.columns['frame_index'].write(self.frame_index[:n])
+            self.columns['timestamp'].write(self.timestamp[:n])
+            self.columns['landmarks'].write(self.landmarks[:n])
+            self.n_buffered = 0
+
+    def close(self):
+        self.flush()
+        for column in self.columns.values():
+            column.close()
+        self.metadata['num_frames'] = self.columns['frame_index'].length
+        with open(os.path.join(self.path, 'metadata.json'), 'w') as f:
+            json.dump(self.metadata, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_landmarks(path, mmap_mode='r'):
+    # Returns (frame_index, timestamp, landmarks, metadata) written by LandmarkSink
+    frame_index = np.load(os.path.join(path, 'frame_index.npy'), mmap_mode=mmap_mode)
+    timestamp = np.load(os.path.join(path, 'timestamp.npy'), mmap_mode=mmap_mode)
+    landmarks = np.load(os.path.join(path, 'landmarks.npy'), mmap_mode=mmap_mode)
+    with open(os.path.join(path, 'metadata.json')) as f:
+        metadata = json.load(f)
+    return frame_index, timestamp, landmarks, metadata
@@ -0,0 +1,268 @@
+import argparse
+import time
+
+import numpy as np
+
+from landmark_metrics import landmark_jitter
+from landmark_sink import LandmarkSink, load_landmarks
+
+SMOOTHING_METHODS = ('one_euro', 'kalman')
+
+
+class OneEuroFilter:
+    """
+    One-Euro filter (Casiez et al. 2012) on all landmark coordinates at once.
+
+    min_cutoff: cutoff frequency (Hz) at rest; lower removes more jitter
+    beta:       cutoff increase per unit of speed (normalized units/s); higher reduces the lag
+                during fast movements
+    d_cutoff:   cutoff frequency (Hz) of the speed estimate
+
+    The defaults are tuned on benchmark(): with a lower beta the filter lags behind reaching
+    movements and the position error grows above the raw landmarks.
+
+    filter(landmarks, timestamp) smooths x, y, z of a (33, 3+) array in O(1) per frame; other
+    columns (visibility) are passed through. A frame without pose (NaN) resets the filter.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=50.0, d_cutoff=2.0, fps=30.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.dt = 1.0 / fps
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.dx = None
+        self.t = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def filter(self, landmarks, timestamp=None):
+        # timestamp in seconds; without timestamps the frames are 1/fps apart
+        if np.isnan(landmarks[0, 0]):
+            self.reset()
+            return landmarks
+        x = landmarks[:, :3].astype(np.float64)
+        if self.x is None:
+            self.x, self.dx, self.t = x, np.zeros_like(x), timestamp
+            return landmarks
+
+        dt = timestamp - self.t if timestamp is not None and self.t is not None and timestamp > self.t else self.dt
+        self.dx += self._alpha(self.d_cutoff, dt) * ((x - self.x) / dt - self.dx)
+        cutoff = self.min_cutoff + self.beta * np.abs(self.dx)
+        self.x += self._alpha(cutoff, dt) * (x - self.x)
+        self.t = timestamp
+
+        smoothed = landmarks.copy()
+        smoothed[:, :3] = self.x
+        return smoothed
+
+    def filter_sequence(self, x, dt):
+        # Batch version of filter() for a (T, 33, 3) float64 run of frames that all have a pose,
+        # smoothed in place; dt: (T,) seconds since the previous frame. Does not touch the streaming state
+        alpha_d = self._alpha(self.d_cutoff, dt).tolist()
+        steps = dt.tolist()
+        dx = np.zeros_like(x[0])
+        for i in range(1, len(x)):
+            change = x[i] - x[i - 1]
+            dx += alpha_d[i] * (change / steps[i] - dx)
+            x[i] = x[i - 1] + self._alpha(self.min_cutoff + self.beta * np.abs(dx), steps[i]) * change
+        return x
+
+
+class KalmanFilter:
+    """
+    Constant-velocity Kalman filter on all landmark coordinates at once.
+
+    process_noise:     white-noise acceleration density ((normalized units/s^2)^2 / Hz);
+                       higher follows fast movements more closely
+    measurement_noise: standard deviation of the landmark jitter (normalized units)
+
+    Every coordinate has the same motion and noise model, so they share one 2x2 covariance and
+    gain; the state is a position and a velocity per coordinate. filter() works like
+    OneEuroFilter.filter().
+    """
+
+    def __init__(self, process_noise=1.0, measurement_noise=0.005, fps=30.0):
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.dt = 1.0 / fps
+        self.reset()
+
+    def reset(self):
+        self.x = None
+        self.v = None
+        self.P = None
+        self.t = None
+
+    def _predict(self, dt):
+        # x' = F x, P' = F P F^T + Q with F = [[1, dt], [0, 1]]
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        Q = self.process_noise * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        self.x = self.x + dt * self.v
+        self.P = F @ self.P @ F.T + Q
+
+    def filter(self, landmarks, timestamp=None):
+        if np.isnan(landmarks[0, 0]):
+            self.reset()
+            return landmarks
+        z = landmarks[:, :3].astype(np.float64)
+        if self.x is None:
+            self.x, self.v, self.t = z, np.zeros_like(z), timestamp
+            self.P = np.diag([self.measurement_noise ** 2, 1.0])
+            return landmarks
+
+        dt = timestamp - self.t if timestamp is not None and self.t is not None and timestamp > self.t else self.dt
+        self._predict(dt)
+        # Position measurement: H = [1, 0]
+        gain = self.P[:, 0] / (self.P[0, 0] + self.measurement_noise ** 2)
+        innovation = z - self.x
+        self.x = self.x + gain[0] * innovation
+        self.v = self.v + gain[1] * innovation
+        self.P = self.P - np.outer(gain, self.P[0])
+        self.t = timestamp
+
+        smoothed = landmarks.copy()
+        smoothed[:, :3] = self.x
+        return smoothed
+
+    def filter_sequence(self, z, dt):
+        # Batch version of filter(), see OneEuroFilter.filter_sequence(). The covariance does not
+        # depend on the measurements, so all gains are computed first, on scalars (P = [[p00, p01], [p01, p11]])
+        r = self.measurement_noise ** 2
+        p00, p01, p11 = r, 0.0, 1.0
+        steps = dt.tolist()
+        gains = np.zeros((len(z), 2))
+        for i in range(1, len(z)):
+            step = steps[i]
+            # P = F P F^T + Q
+            p00, p01, p11 = (p00 + 2 * step * p01 + step * step * p11 + self.process_noise * step ** 3 / 3,
+                             p01 + step * p11 + self.process_noise * step ** 2 / 2,
+                             p11 + self.process_noise * step)
+            g0, g1 = p00 / (p00 + r), p01 / (p00 + r)
+            gains[i] = g0, g1
+            p00, p01, p11 = p00 - g0 * p00, p01 - g0 * p01, p11 - g1 * p01
+
+        x = z[0].copy()
+        v = np.zeros_like(x)
+        for i in range(1, len(z)):
+            x += steps[i] * v
+            innovation = z[i] - x
+            x += gains[i, 0] * innovation
+            v += gains[i, 1] * innovation
+            z[i] = x
+        return z
+
+
+def create_filter(method, fps=30.0, **params):
+    if method == 'one_euro':
+        return OneEuroFilter(fps=fps, **params)
+    if method == 'kalman':
+        return KalmanFilter(fps=fps, **params)
+    raise ValueError('Unknown smoothing method {!r}, expected one of {}'.format(method, SMOOTHING_METHODS))
+
+
+def smooth_landmarks(landmarks, method='one_euro', fps=30.0, timestamps=None, **params):
+    """
+    Batch smoothing of a (frames, 33, 3+) array, e.g. from load_landmarks(). The result is the
+    same as streaming the frames through create_filter(method).
+
+    The filters are recursive in time, so only the state update runs per frame. The time steps,
+    the runs of frames with a pose and the dtype conversion are done on the whole array at once.
+    """
+    landmark_filter = create_filter(method, fps, **params)
+    smoothed = np.array(landmarks, copy=True)
+
+    # Seconds since the previous frame (1/fps without timestamps or where they do not increase)
+    dt = np.full(len(smoothed), 1.0 / fps)
+    if timestamps is not None and len(smoothed) > 1:
+        steps = np.diff(np.asarray(timestamps, np.float64))
+        dt[1:] = np.where(steps > 0, steps, dt[1:])
+
+    # A frame without pose resets the filter: smooth each run of detected frames on its own
+    detected = np.concatenate(([False], ~np.isnan(smoothed[:, 0, 0]), [False]))
+    edges = np.flatnonzero(detected[1:] != detected[:-1])
+    for start, end in zip(edges[::2], edges[1::2]):
+        smoothed[start:end, :, :3] = landmark_filter.filter_sequence(smoothed[start:end, :, :3].astype(np.float64), dt[start:end])
+    return smoothed
+
+
+def _synthetic_reach(n_frames, fps, noise, seed=0):
+    # Reaching-like motion (0.3 normalized units in ~1 s) plus Gaussian jitter
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames) / fps
+    clean = np.zeros((n_frames, 33, 4), np.float32)
+    clean[..., 0] = 0.5 + 0.15 * np.sin(np.pi * t)[:, None] + np.linspace(-0.2, 0.2, 33)
+    clean[..., 1] = 0.5 + 0.15 * np.cos(np.pi * t)[:, None]
+    clean[..., 3] = 1.0
+    noisy = clean.copy()
+    noisy[..., :3] += rng.normal(0.0, noise, (n_frames, 33, 3)).astype(np.float32)
+    return clean, noisy
+
+
+def _lag_frames(reference, smoothed, max_lag=15):
+    # Delay (frames) of the smoothed x trajectory against the reference, by cross-correlation
+    a = reference[:, :, 0] - reference[:, :, 0].mean(axis=0)
+    b = smoothed[:, :, 0] - smoothed[:, :, 0].mean(axis=0)
+    return max(range(max_lag + 1), key=lambda lag: float((a[:len(a) - lag] * b[lag:]).sum()))
+
+
+def _peak_speed(reference, smoothed, fps):
+    # Smoothed / true speed during the fastest 10% of the movement (< 1: flattened velocity peaks)
+    true_speed = np.linalg.norm(np.diff(reference[..., :2], axis=0), axis=-1) * fps
+    speed = np.linalg.norm(np.diff(smoothed[..., :2], axis=0), axis=-1) * fps
+    peak = true_speed > np.percentile(true_speed, 90)
+    return float(np.median(speed[peak] / true_speed[peak]))
+
+
+def benchmark(n_frames=3000, fps=30.0, noise=0.005):
+    # Cost per frame (streaming) and smoothing quality on synthetic data: jitter against the
+    # position error, lag and peak speed it costs
+    clean, noisy = _synthetic_reach(n_frames, fps, noise)
+    raw_error = float(np.abs(noisy[..., :2] - clean[..., :2]).mean())
+    print('Raw:       jitter {:.5f}, error {:.5f}, lag {} frames, peak speed {:.2f}'.format(
+        landmark_jitter(noisy, 1, 1), raw_error, _lag_frames(clean, noisy), _peak_speed(clean, noisy, fps)))
+    results = {}
+    for method in SMOOTHING_METHODS:
+        landmark_filter = create_filter(method, fps)
+        smoothed = np.empty_like(noisy)
+        start = time.perf_counter()
+        for i, frame_landmarks in enumerate(noisy):
+            smoothed[i] = landmark_filter.filter(frame_landmarks, i / fps)
+        elapsed = time.perf_counter() - start
+        results[method] = {
+            'us_per_frame': elapsed / n_frames * 1e6,
+            'jitter': landmark_jitter(smoothed, 1, 1),
+            'error': float(np.abs(smoothed[..., :2] - clean[..., :2]).mean()),
+            'lag_frames': _lag_frames(clean, smoothed),
+            'peak_speed': _peak_speed(clean, smoothed, fps),
+        }
+        results[method]['error_vs_raw'] = results[method]['error'] / raw_error
+        print('{:<10} {us_per_frame:.1f} us/frame, jitter {jitter:.5f}, error {error:.5f} ({error_vs_raw:.0%} of raw), '
+              'lag {lag_frames} frames, peak speed {peak_speed:.2f}'.format(method + ':', **results[method]))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Smooth exported landmarks (see landmark_sink.py) or benchmark the filters.')
+    parser.add_argument('landmarks', nargs='?', help='landmark directory to smooth')
+    parser.add_argument('output', nargs='?', help='directory for the smoothed landmarks')
+    parser.add_argument('--method', choices=SMOOTHING_METHODS, default='one_euro')
+    parser.add_argument('--benchmark', action='store_true', help='cost per frame and jitter reduction on synthetic landmarks')
+    args = parser.parse_args()
+
+    if args.benchmark or not args.landmarks:
+        benchmark()
+    else:
+        frame_index, timestamp, landmarks, metadata = load_landmarks(args.landmarks, mmap_mode=None)
+        fps = metadata.get('fps') or 30.0
+        smoothed = smooth_landmarks(landmarks, args.method, fps, timestamp if fps else None)
+        metadata['smoothing'] = args.method
+        with LandmarkSink(args.output or args.landmarks.rstrip('/') + '_' + args.method, metadata=metadata) as sink:
+            for i in range(len(smoothed)):
+                sink.append(frame_index[i], timestamp[i], smoothed[i])
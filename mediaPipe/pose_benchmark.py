@@ -0,0 +1,187 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# name -> (width, height, fps, frames)
+FIXTURES = {
+    'vga30': (640, 480, 30, 150),
+    'hd30': (1280, 720, 30, 150),
+    'fhd60': (1920, 1080, 60, 120),
+}
+PATHS = ('image', 'video', 'webcam')
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'PoseTracking', 'benchmark')
+
+
+def synthetic_frame(background, t):
+    # Stick figure reaching with the right arm on a fixed textured background
+    frame = background.copy()
+    height, width = frame.shape[:2]
+    scale = height / 480.0
+    cx, cy = int(width * (0.5 + 0.05 * np.sin(0.5 * t))), int(height * 0.45)
+
+    def point(x, y):
+        return int(cx + x * scale), int(cy + y * scale)
+
+    shoulder_r, shoulder_l, hip = point(-40, -60), point(40, -60), point(0, 60)
+    elbow = point(-40 - 60 * np.cos(t), -60 + 60 * np.sin(t))
+    wrist = point(-40 - 120 * np.cos(t), -60 + 40 * np.sin(2 * t))
+    skin, shirt = (140, 170, 220), (60, 60, 160)
+    cv2.circle(frame, point(0, -110), int(30 * scale), skin, -1)
+    cv2.line(frame, shoulder_r, shoulder_l, shirt, int(20 * scale))
+    cv2.line(frame, point(0, -60), hip, shirt, int(50 * scale))
+    for start, end in ((shoulder_r, elbow), (elbow, wrist), (shoulder_l, point(60, 20)), (hip, point(-30, 180)), (hip, point(30, 180))):
+        cv2.line(frame, start, end, skin, int(14 * scale))
+    return frame
+
+
+def make_fixture(fixture_dir, name, n_images=20, seed=0):
+    # Deterministic video (and stills) for a fixture; reused if it already exists
+    width, height, fps, n_frames = FIXTURES[name]
+    video_path = os.path.join(fixture_dir, name + '.mp4')
+    image_dir = os.path.join(fixture_dir, name + '_images')
+    if os.path.exists(video_path) and os.path.isdir(image_dir):
+        return video_path, image_dir
+
+    os.makedirs(image_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    background = cv2.resize(rng.integers(0, 256, (height // 16, width // 16, 3), dtype=np.uint8), (width, height), interpolation=cv2.INTER_LINEAR)
+    out = cv2.VideoWriter(video_path + '.tmp.mp4', cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(n_frames):
+        frame = synthetic_frame(background, 2 * np.pi * i / (2 * fps))
+        out.write(frame)
+        if i < n_images:
+            cv2.imwrite(os.path.join(image_dir, '{:04d}.png'.format(i)), frame)
+    out.release()
+    os.replace(video_path + '.tmp.mp4', video_path)
+    return video_path, image_dir
+
+
+def run_case(path, video_path, image_dir, model_complexity):
+    # Runs in a fresh (spawned) process, so the peak RSS belongs to this case only
+    from pose_engine import get_pose_engine
+    from stage_timer import timer
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        if path == 'image':
+            import pose_vizualization_image
+            pose_vizualization_image.init_worker(dict( model_complexity=model_complexity ))
+            image_paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir))
+            timer.configure()
+            start = time.perf_counter()
+            for image_path in image_paths:
+                pose_vizualization_image.annotate_image((image_path, os.path.join(work_dir, os.path.basename(image_path))))
+            n_frames = len(image_paths)
+        elif path == 'video':
+            from pose_vizualization_video import annotate_video
+            pose = get_pose_engine( model_complexity=model_complexity )
+            timer.configure()
+            start = time.perf_counter()
+            n_frames = annotate_video(video_path, os.path.join(work_dir, 'annotated.mp4'), pose, preview_every=0)
+        elif path == 'webcam':
+            # The webcam loop on a file: every frame is processed (no drops), headless
+            from pose_vizualization_webcam import run_webcam
+            pose = get_pose_engine( model_complexity=model_complexity )
+            timer.configure()
+            start = time.perf_counter()
+            n_frames = run_webcam(pose, video_path, preview_every=0, latest_frame=False)
+        else:
+            raise ValueError('Unknown benchmark path {!r}, expected one of {}'.format(path, PATHS))
+        elapsed = time.perf_counter() - start
+
+    return {
+        'frames': n_frames,
+        'seconds': elapsed,
+        'fps': n_frames / elapsed,
+        # ru_maxrss is in kB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        'stages': timer.summary(),
+    }
+
+
+def environment():
+    import importlib.metadata
+    try:
+        mediapipe_version = importlib.metadata.version('mediapipe')
+    except importlib.metadata.PackageNotFoundError:
+        mediapipe_version = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'mediapipe': mediapipe_version,
+    }
+
+
+def run_benchmark(fixtures, paths, fixture_dir=DEFAULT_FIXTURE_DIR, model_complexity=2):
+    os.makedirs(fixture_dir, exist_ok=True)
+    results = {}
+    spawn = multiprocessing.get_context('spawn')
+    for name in fixtures:
+        video_path, image_dir = make_fixture(fixture_dir, name)
+        for path in paths:
+            with spawn.Pool(1) as pool:
+                result = pool.apply(run_case, (path, video_path, image_dir, model_complexity))
+            results['{}/{}'.format(name, path)] = result
+            print('{:<14} {frames:>5} frames {fps:8.1f} fps {peak_rss_mb:8.0f} MB peak RSS'.format(name + '/' + path, **result))
+    return {'environment': environment(), 'model_complexity': model_complexity, 'results': results}
+
+
+def compare(report, baseline, tolerance=0.1, min_stage_ms=0.5):
+    # Cases that got more than tolerance slower (fps, p95 of every stage) or bigger (peak RSS) than the
+    # baseline. A stage also has to get min_stage_ms slower, sub-millisecond stages are mostly noise
+    regressions = []
+    for case, result in report['results'].items():
+        reference = baseline.get('results', {}).get(case)
+        if reference is None:
+            continue
+        if result['fps'] < reference['fps'] * (1 - tolerance):
+            regressions.append('{}: {:.1f} fps, baseline {:.1f} fps'.format(case, result['fps'], reference['fps']))
+        if result['peak_rss_mb'] > reference['peak_rss_mb'] * (1 + tolerance):
+            regressions.append('{}: {:.0f} MB peak RSS, baseline {:.0f} MB'.format(case, result['peak_rss_mb'], reference['peak_rss_mb']))
+        for stage, stats in result.get('stages', {}).items():
+            reference_stats = reference.get('stages', {}).get(stage)
+            if reference_stats is None:
+                continue
+            p95, reference_p95 = stats['p95_ms'], reference_stats['p95_ms']
+            if p95 > reference_p95 * (1 + tolerance) and p95 - reference_p95 > min_stage_ms:
+                regressions.append('{}: {} p95 {:.2f} ms, baseline {:.2f} ms'.format(case, stage, p95, reference_p95))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the image, video and webcam pose paths on deterministic synthetic videos.')
+    parser.add_argument('--fixtures', nargs='+', choices=sorted(FIXTURES), default=sorted(FIXTURES))
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS))
+    parser.add_argument('--fixture-dir', default=DEFAULT_FIXTURE_DIR, help='where the synthetic videos are generated (default: %(default)s)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2))
+    parser.add_argument('--output', default='benchmark.json', help='results (JSON), usable as a later --baseline')
+    parser.add_argument('--baseline', help='earlier results to compare against; exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='allowed fps drop / peak RSS and stage p95 increase against the baseline (fraction)')
+    parser.add_argument('--min-stage-ms', type=float, default=0.5, help='ignore stage p95 increases smaller than this (ms)')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.fixtures, args.paths, args.fixture_dir, args.model_complexity)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {}'.format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.min_stage_ms)
+        for regression in regressions:
+            print('Regression: ' + regression)
+        if regressions:
+            raise SystemExit(1)
+        print('No regressions against {}'.format(args.baseline))
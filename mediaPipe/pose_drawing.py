@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+
+# Landmarks with a lower visibility are skipped, same as mp.solutions.drawing_utils. The landmark
+# arrays have no presence column, so drawing_utils' presence threshold (also 0.5) is not applied
+VISIBILITY_THRESHOLD = 0.5
+
+# Connections as (K, 2) index arrays, based on MediaPipe Pose landmark numbering
+# (same as sorted(mp.solutions.pose.POSE_CONNECTIONS), copied so drawing does not import mediapipe)
+POSE_CONNECTIONS = np.array([
+    (0, 1), (0, 4), (1, 2), (2, 3), (3, 7), (4, 5), (5, 6), (6, 8), (9, 10), (11, 12), (11, 13), (11, 23),
+    (12, 14), (12, 24), (13, 15), (14, 16), (15, 17), (15, 19), (15, 21), (16, 18), (16, 20), (16, 22),
+    (17, 19), (18, 20), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28), (27, 29), (27, 31), (28, 30),
+    (28, 32), (29, 31), (30, 32),
+], np.intp)
+RIGHT_ARM_CONNECTIONS = np.array([
+    (12, 14),  # Right shoulder to right elbow
+    (14, 16),  # Right elbow to right wrist
+], np.intp)
+RIGHT_ARM_LANDMARKS = np.array([11, 12, 14, 16], np.intp)  # Shoulders, right elbow and wrist
+
+WHITE_COLOR = (224, 224, 224)
+
+# mp.solutions.drawing_styles.get_default_pose_landmarks_style() as (33, 3) colors:
+# white nose, (0, 138, 255) for the left and (231, 217, 0) for the right landmarks
+POSE_LANDMARK_COLORS = np.array([WHITE_COLOR] + [(0, 138, 255) if i in (1, 2, 3, 7) or (i >= 9 and i % 2) else (231, 217, 0)
+                                                  for i in range(1, 33)], np.int32)
+
+
+def landmarks_to_pixels(landmarks, image_shape):
+    # (N, >=2) normalized landmarks -> (N, 2) int32 pixel coordinates (truncated), in one vectorized step
+    height, width = image_shape[:2]
+    return (landmarks[:, :2] * (width, height)).astype(np.int32)
+
+
+def landmarks_to_image_pixels(landmarks, image_shape):
+    # Conversion of mp.solutions.drawing_utils._normalized_to_pixel_coordinates, vectorized: returns the
+    # (N, 2) pixels (floored, clamped to the last row/column) and an (N,) mask of the landmarks inside [0, 1]
+    height, width = image_shape[:2]
+    xy = landmarks[:, :2].astype(np.float64)
+    inside = ((xy >= 0) & ((xy <= 1) | np.isclose(xy, 1, rtol=1e-9, atol=0))).all(axis=1)
+    pixels = np.minimum(np.floor(np.where(inside[:, None], xy, 0) * (width, height)), (width - 1, height - 1))
+    return pixels.astype(np.int32), inside
+
+
+def draw_pose(image, landmarks, connections=POSE_CONNECTIONS, landmark_indices=None,
+              landmark_color=(83, 88, 93), connection_color=(255, 88, 0), thickness=8, circle_radius=10,
+              visibility_threshold=None, landmark_border=False, clip_to_image=False):
+    """
+    Draw landmarks and connections directly into image (no copy, no protobuf).
+
+    landmarks:            (33, 4) array of x, y, z, visibility (NaN if no pose was detected)
+    landmark_indices:     landmarks to draw as circles (default: all)
+    landmark_color:       one color, or one color per landmark (e.g. POSE_LANDMARK_COLORS)
+    visibility_threshold: skip landmarks (and their connections) with a lower visibility
+    landmark_border:      draw a white ring around each landmark like mp.solutions.drawing_utils
+    clip_to_image:        skip landmarks outside the image and floor/clamp the others like
+                          mp.solutions.drawing_utils (default: truncate, draw everything)
+    """
+    if np.isnan(landmarks[0, 0]):
+        return image
+
+    visible = None
+    if clip_to_image:
+        pixels, visible = landmarks_to_image_pixels(landmarks, image.shape)
+    else:
+        pixels = landmarks_to_pixels(landmarks, image.shape)
+    if visibility_threshold is not None:
+        above = landmarks[:, 3] >= visibility_threshold
+        visible = above if visible is None else visible & above
+    if visible is not None:
+        connections = connections[visible[connections].all(axis=1)]
+
+    # All segments in a single call
+    if len(connections):
+        cv2.polylines(image, list(pixels[connections]), False, connection_color, thickness)
+
+    if landmark_indices is None:
+        landmark_indices = np.arange(len(landmarks))
+    if visible is not None:
+        landmark_indices = landmark_indices[visible[landmark_indices]]
+    border_radius = max(circle_radius + 1, int(circle_radius * 1.2))
+    colors = np.broadcast_to(np.asarray(landmark_color, np.int32), (len(landmarks), 3))[landmark_indices].tolist()
+    for (x, y), color in zip(pixels[landmark_indices].tolist(), colors):
+        if landmark_border:
+            cv2.circle(image, (x, y), border_radius, WHITE_COLOR, thickness)
+        cv2.circle(image, (x, y), circle_radius, color, thickness)
+    return image
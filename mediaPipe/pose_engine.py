@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+
+import startup_profile
+from landmark_sink import landmarks_to_array
+
+# Running modes of the Tasks PoseLandmarker
+RUNNING_MODES = ('image', 'video', 'live_stream')
+
+# Engines of get_pose_engine, one per settings in this process
+_engines = {}
+
+
+def _mediapipe():
+    # Imported on first use (about a second), so argument parsing and cache hits do not pay for it
+    return startup_profile.import_module('mediapipe')
+
+
+def tasks_landmarks_to_array(pose_landmarks_list):
+    # First pose of a PoseLandmarkerResult.pose_landmarks -> (33, 4) float32 array (NaN if no pose)
+    if not pose_landmarks_list:
+        return landmarks_to_array(None)
+    return np.array([(landmark.x, landmark.y, landmark.z, 1.0 if landmark.visibility is None else landmark.visibility)
+                     for landmark in pose_landmarks_list[0]], np.float32)
+
+
+class SolutionsPoseEngine:
+    """
+    Legacy mp.solutions.pose.Pose behind the engine interface.
+
+    detect(image_rgb, timestamp_ms) -> (33, 4) landmark array. The legacy graph tracks
+    internally and ignores the timestamp; submit()/latest() run synchronously.
+    running_mode is 'image' with static_image_mode, 'video' otherwise (None for a wrapped Pose instance).
+    """
+
+    live = False
+
+    def __init__(self, pose=None, **settings):
+        self.pose = pose if pose is not None else _mediapipe().solutions.pose.Pose(**settings)
+        self.running_mode = None if pose is not None else ('image' if settings.get('static_image_mode') else 'video')
+        self.result = (None, landmarks_to_array(None))
+
+    def detect(self, image_rgb, timestamp_ms=None):
+        return landmarks_to_array(self.pose.process(image_rgb).pose_landmarks)
+
+    def submit(self, image_rgb, timestamp_ms):
+        self.result = (timestamp_ms, self.detect(image_rgb, timestamp_ms))
+
+    def latest(self):
+        return self.result
+
+    def close(self):
+        self.pose.close()
+
+
+class TasksPoseEngine:
+    """
+    MediaPipe Tasks PoseLandmarker (model_asset_path: pose_landmarker_{lite,full,heavy}.task).
+
+    running_mode 'video':       detect(image_rgb, timestamp_ms) uses temporal tracking between
+                                frames; timestamps must increase monotonically.
+    running_mode 'live_stream': submit(image_rgb, timestamp_ms) returns immediately, the
+                                landmarker drops frames while it is busy and latest() returns
+                                the newest (timestamp_ms, landmarks) from the result callback.
+    running_mode 'image':       independent detection per image.
+    """
+
+    def __init__(self, model_asset_path, running_mode='video', num_poses=1, min_pose_detection_confidence=0.5,
+                 min_pose_presence_confidence=0.5, min_tracking_confidence=0.5):
+        if running_mode not in RUNNING_MODES:
+            raise ValueError('Unknown running mode {!r}, expected one of {}'.format(running_mode, RUNNING_MODES))
+        mp = _mediapipe()
+        vision = mp.tasks.vision
+        self.running_mode = running_mode
+        self.live = running_mode == 'live_stream'
+        self.lock = threading.Lock()
+        self.result = (None, landmarks_to_array(None))
+
+        options = vision.PoseLandmarkerOptions(
+            base_options=mp.tasks.BaseOptions(model_asset_path=model_asset_path),
+            running_mode=getattr(vision.RunningMode, running_mode.upper()),
+            num_poses=num_poses,
+            min_pose_detection_confidence=min_pose_detection_confidence,
+            min_pose_presence_confidence=min_pose_presence_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+            result_callback=self._on_result if self.live else None)
+        self.landmarker = vision.PoseLandmarker.create_from_options(options)
+        self.mp = mp
+
+    def _on_result(self, result, output_image, timestamp_ms):
+        landmarks = tasks_landmarks_to_array(result.pose_landmarks)
+        with self.lock:
+            self.result = (timestamp_ms, landmarks)
+
+    def detect(self, image_rgb, timestamp_ms=None):
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=image_rgb)
+        if self.running_mode == 'video':
+            result = self.landmarker.detect_for_video(image, int(timestamp_ms))
+        elif self.running_mode == 'image':
+            result = self.landmarker.detect(image)
+        else:
+            raise RuntimeError("detect() is not available in 'live_stream' mode, use submit() and latest()")
+        return tasks_landmarks_to_array(result.pose_landmarks)
+
+    def submit(self, image_rgb, timestamp_ms):
+        if not self.live:
+            self.result = (timestamp_ms, self.detect(image_rgb, timestamp_ms))
+            return
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=image_rgb)
+        self.landmarker.detect_async(image, int(timestamp_ms))
+
+    def latest(self):
+        with self.lock:
+            return self.result
+
+    def close(self):
+        self.landmarker.close()
+
+
+def as_engine(pose):
+    # Accept a legacy Pose instance wherever an engine is expected
+    if isinstance(pose, (SolutionsPoseEngine, TasksPoseEngine)):
+        return pose
+    return SolutionsPoseEngine(pose)
+
+
+def create_pose_engine(engine='solutions', model_asset_path=None, running_mode='video', model_complexity=2,
+                       min_detection_confidence=0.5, min_tracking_confidence=0.5):
+    if engine == 'solutions':
+        # 'image' runs the legacy graph without tracking (static_image_mode)
+        return SolutionsPoseEngine(static_image_mode=running_mode == 'image', model_complexity=model_complexity,
+                                   min_detection_confidence=min_detection_confidence,
+                                   min_tracking_confidence=min_tracking_confidence)
+    if engine == 'tasks':
+        if model_asset_path is None:
+            raise ValueError("The 'tasks' engine needs a model_asset_path (pose_landmarker_*.task)")
+        return TasksPoseEngine(model_asset_path, running_mode, min_pose_detection_confidence=min_detection_confidence,
+                               min_tracking_confidence=min_tracking_confidence)
+    raise ValueError('Unknown pose engine {!r}'.format(engine))
+
+
+def get_pose_engine(engine='solutions', model_asset_path=None, running_mode='video', warmup=True, **settings):
+    """
+    Shared engine per process: the graph is built (and warmed up) on the first call with these
+    settings, later calls return the same engine. For sequential use only; use create_pose_engine
+    for engines that need their own tracking state (e.g. one per camera).
+    """
+    key = (engine, model_asset_path, running_mode, tuple(sorted(settings.items())))
+    if key not in _engines:
+        _mediapipe()
+        with startup_profile.stage('load model'):
+            pose_engine = create_pose_engine(engine, model_asset_path, running_mode, **settings)
+            # The legacy graph initializes on its first image; a blank image leaves no tracking state.
+            # Video and live-stream landmarkers are not warmed up, their timestamps must start with the first frame
+            if warmup and (engine == 'solutions' or running_mode == 'image'):
+                pose_engine.detect(np.zeros((64, 64, 3), np.uint8), 0)
+        _engines[key] = pose_engine
+    return _engines[key]
@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+
+import cv2
+
+from stage_timer import timer
+
+# Marker that is passed through the queues after the last frame
+_END = object()
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up once the pipeline is stopped (back-pressure without deadlock)
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _read_frames(cap, frames_q, free_q, stop, errors):
+    try:
+        while not stop.is_set():
+            # Decode into a recycled frame buffer if one is available
+            try:
+                frame = free_q.get_nowait()
+            except queue.Empty:
+                frame = None
+            with timer.stage('decode'):
+                ret, frame = cap.read(frame)
+            if not ret:
+                break
+            if not _put(frames_q, frame, stop):
+                return
+    except Exception as e:
+        # Raised again by run_pipeline, the other stages shut down
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(frames_q, _END, stop)
+
+
+def _process_frames(process_fn, frames_q, results_q, stop, errors, many):
+    try:
+        while not stop.is_set():
+            try:
+                frame = frames_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame is _END:
+                if many:
+                    # Flush frames that process_fn is still holding back
+                    for item in process_fn(None):
+                        if not _put(results_q, item, stop):
+                            return
+                break
+            items = process_fn(frame) if many else [(frame, process_fn(frame))]
+            for item in items:
+                if not _put(results_q, item, stop):
+                    return
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    _put(results_q, _END, stop)
+
+
+def run_pipeline(cap, process_fn, write_fn, queue_size=8, reuse_frames=True, many=False):
+    """
+    Run reader -> inference -> writer as three concurrent stages.
+
+    cap:        opened cv2.VideoCapture (read in a background thread)
+    process_fn: process_fn(frame) -> result, runs in the inference thread
+    write_fn:   write_fn(frame, result) -> False to stop early, runs in the calling thread
+
+    The stages are connected by bounded FIFO queues, so frames stay in order and a slow
+    stage throttles the faster ones. Returns the number of written frames.
+
+    With reuse_frames, frame buffers are handed back to the reader after write_fn returns,
+    so no frames are allocated after warm-up. process_fn and write_fn must not keep
+    references to the frame in that case.
+
+    With many, process_fn(frame) returns a list of (frame, result) pairs that are ready,
+    which lets it hold frames back (e.g. to interpolate between keyframes). It is called
+    with None after the last frame to flush the remaining pairs.
+    """
+    frames_q = queue.Queue(maxsize=queue_size)
+    results_q = queue.Queue(maxsize=queue_size)
+    free_q = queue.Queue()
+    stop = threading.Event()
+    errors = []
+
+    reader = threading.Thread(target=_read_frames, args=(cap, frames_q, free_q, stop, errors), daemon=True)
+    worker = threading.Thread(target=_process_frames, args=(process_fn, frames_q, results_q, stop, errors, many), daemon=True)
+    reader.start()
+    worker.start()
+
+    n_frames = 0
+    try:
+        while True:
+            try:
+                item = results_q.get(timeout=0.1)
+            except queue.Empty:
+                if not worker.is_alive():
+                    break
+                continue
+            if item is _END:
+                break
+            frame, result = item
+            n_frames += 1
+            if write_fn(frame, result) is False:
+                break
+            if reuse_frames:
+                free_q.put(frame)
+    finally:
+        stop.set()
+        # Unblock stages that are waiting on a full queue
+        for q in (frames_q, results_q):
+            try:
+                while True:
+                    q.get_nowait()
+            except queue.Empty:
+                pass
+        reader.join()
+        worker.join()
+
+    if errors:
+        raise errors[0]
+    return n_frames
+
+
+class LatestFrameCapture:
+    """
+    Reads a live camera in a background thread and only keeps the newest frame.
+
+    Frames that arrive while the consumer is still busy are dropped instead of queueing
+    up in the driver, so the processed frame is never older than one capture interval.
+    read() returns (ret, frame, capture_time) with capture_time from time.perf_counter().
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        # Ask the driver for a minimal internal queue (not supported by every backend)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.condition = threading.Condition()
+        self.frame = None
+        self.capture_time = None
+        self.frame_id = 0
+        self.read_id = 0
+        self.n_dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._capture, daemon=True)
+        self.thread.start()
+
+    def _capture(self):
+        try:
+            while self.running:
+                with timer.stage('capture'):
+                    ret, frame = self.cap.read()
+                capture_time = time.perf_counter()
+                with self.condition:
+                    if not ret:
+                        self.running = False
+                    else:
+                        if self.frame_id > self.read_id:
+                            self.n_dropped += 1
+                        self.frame, self.capture_time = frame, capture_time
+                        self.frame_id += 1
+                    self.condition.notify_all()
+        finally:
+            # Also if cap.read() raised: wake up read() so it does not wait forever
+            with self.condition:
+                self.running = False
+                self.condition.notify_all()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, timeout=None):
+        # Wait for a frame that has not been returned yet. Fails only once the capture has
+        # stopped (or after timeout seconds, if given): slow first frames and stalls are waited out
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id > self.read_id or not self.running, timeout)
+            if self.frame_id == self.read_id:
+                return False, None, None
+            self.read_id = self.frame_id
+            return True, self.frame, self.capture_time
+
+    def release(self):
+        self.running = False
+        self.thread.join()
+        self.cap.release()
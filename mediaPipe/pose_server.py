@@ -0,0 +1,272 @@
+import argparse
+import collections
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from pose_engine import create_pose_engine
+
+
+def _attach(name):
+    # Attach to an existing block; only the PoseServer that created it unlinks it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument. Producers and workers are children of the
+        # server process and share its resource tracker, where registering again is a no-op
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    # n_slots frames of frame_shape (uint8) in one shared memory block
+
+    def __init__(self, frame_shape, n_slots, name=None):
+        self.frame_shape = tuple(frame_shape)
+        self.n_slots = n_slots
+        slot_size = int(np.prod(self.frame_shape))
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=slot_size * n_slots)
+            self.owner = True
+        else:
+            self.shm = _attach(name)
+            self.owner = False
+        self.name = self.shm.name
+        self.slots = np.ndarray((n_slots,) + self.frame_shape, np.uint8, buffer=self.shm.buf)
+
+    def close(self):
+        del self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class PoseServerError(RuntimeError):
+    pass
+
+
+class CameraClient:
+    """
+    Producer side of one camera: copies frames into its shared memory ring and queues
+    (camera_id, slot, frame_id, timestamp_ms) requests, so no frame is ever pickled.
+    Picklable, so it can be handed to a producer process.
+
+    A request that failed in the worker raises PoseServerError on the client. Blocking calls
+    raise TimeoutError after timeout seconds without a result (e.g. if the worker died).
+    """
+
+    def __init__(self, camera_id, ring_name, frame_shape, n_slots, request_q, response_q, timeout=60.0):
+        self.camera_id = camera_id
+        self.ring_name = ring_name
+        self.frame_shape = tuple(frame_shape)
+        self.n_slots = n_slots
+        self.request_q = request_q
+        self.response_q = response_q
+        self.timeout = timeout
+        self._ring = None
+        self._free_slots = collections.deque(range(n_slots))
+        self._responses = collections.deque()
+        self._frame_id = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_ring'] = None
+        return state
+
+    def _receive(self, block=True, timeout=None):
+        try:
+            camera_id, frame_id, timestamp_ms, slot, landmarks, error = self.response_q.get(block, timeout or self.timeout)
+        except queue.Empty:
+            if not block:
+                raise
+            raise TimeoutError('No result from the pose server for camera {} within {} s'.format(self.camera_id, timeout or self.timeout))
+        self._free_slots.append(slot)
+        if error is not None:
+            raise PoseServerError('Frame {} of camera {} failed in the pose server:\n{}'.format(frame_id, camera_id, error))
+        self._responses.append((camera_id, frame_id, timestamp_ms, landmarks))
+
+    def submit(self, frame, timestamp_ms, block=True):
+        # Returns the frame id, or None if all slots are busy and block is False
+        if self._ring is None:
+            self._ring = FrameRing(self.frame_shape, self.n_slots, name=self.ring_name)
+        while not self._free_slots:
+            if not block:
+                return None
+            self._receive()
+        slot = self._free_slots.popleft()
+        self._ring.slots[slot] = frame
+        frame_id = self._frame_id
+        self._frame_id += 1
+        self.request_q.put((self.camera_id, self.ring_name, self.frame_shape, self.n_slots, slot, frame_id, timestamp_ms))
+        return frame_id
+
+    def get(self, timeout=None):
+        # Next (camera_id, frame_id, timestamp_ms, landmarks) result of this camera (timeout: default self.timeout)
+        if not self._responses:
+            self._receive(timeout=timeout)
+        return self._responses.popleft()
+
+    def poll(self):
+        # All results that are available right now, without blocking
+        try:
+            while True:
+                self._receive(block=False)
+        except queue.Empty:
+            pass
+        results = list(self._responses)
+        self._responses.clear()
+        return results
+
+    def pending(self):
+        return self.n_slots - len(self._free_slots)
+
+    def close(self):
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+
+
+def _serve(request_q, response_qs, engine_settings):
+    # Worker process: one model per camera routed to this worker, loaded on first use
+    engines = {}
+    rings = {}
+    buffers = {}
+    try:
+        while True:
+            request = request_q.get()
+            if request is None:
+                break
+            camera_id, ring_name, frame_shape, n_slots, slot, frame_id, timestamp_ms = request
+            # Errors are sent back to the client (which raises them), the worker keeps serving
+            landmarks, error = None, None
+            try:
+                if ring_name not in rings:
+                    rings[ring_name] = FrameRing(frame_shape, n_slots, name=ring_name)
+                    buffers[ring_name] = np.empty(frame_shape, np.uint8)
+                if camera_id not in engines:
+                    engines[camera_id] = create_pose_engine(**engine_settings)
+
+                # The conversion copies the frame out of shared memory into a reused RGB buffer
+                image_rgb = cv2.cvtColor(rings[ring_name].slots[slot], cv2.COLOR_BGR2RGB, dst=buffers[ring_name])
+                landmarks = engines[camera_id].detect(image_rgb, timestamp_ms)
+            except Exception:
+                error = traceback.format_exc()
+            response_qs[camera_id].put((camera_id, frame_id, timestamp_ms, slot, landmarks, error))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for engine in engines.values():
+            engine.close()
+        for ring in rings.values():
+            ring.close()
+
+
+class PoseServer:
+    """
+    Long-lived local pose inference service for several cameras.
+
+    cameras:   dict camera_id -> frame shape (height, width, 3) of its BGR frames
+    n_workers: worker processes; cameras are assigned round-robin, so each camera always
+               goes to the same worker (frame order and tracking state are preserved)
+    n_slots:   frames per camera that can be in flight
+    timeout:   seconds a client waits for a result before raising TimeoutError
+
+    Frames are handed over through one shared memory ring per camera. Results come back as
+    (camera_id, frame_id, timestamp_ms, landmarks) on the camera's client.
+    """
+
+    def __init__(self, cameras, n_workers=None, n_slots=4, timeout=60.0, **engine_settings):
+        n_workers = min(n_workers or len(cameras), len(cameras))
+        self.request_qs = [multiprocessing.Queue() for _ in range(n_workers)]
+        response_qs = {camera_id: multiprocessing.Queue() for camera_id in cameras}
+        self.rings = []
+        self.clients = {}
+        for i, (camera_id, frame_shape) in enumerate(cameras.items()):
+            ring = FrameRing(frame_shape, n_slots)
+            self.rings.append(ring)
+            self.clients[camera_id] = CameraClient(camera_id, ring.name, frame_shape, n_slots,
+                                                   self.request_qs[i % n_workers], response_qs[camera_id], timeout)
+        self.workers = [multiprocessing.Process(target=_serve, args=(request_q, response_qs, engine_settings), daemon=True)
+                        for request_q in self.request_qs]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        for request_q in self.request_qs:
+            request_q.put(None)
+        for worker in self.workers:
+            worker.join()
+        for client in self.clients.values():
+            client.close()
+        for ring in self.rings:
+            ring.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _produce(client, input_path, stats):
+    # Demo producer: stream a video (or camera index) through the server
+    cap = cv2.VideoCapture(int(input_path) if input_path.isdigit() else input_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n_frames = 0
+    n_detected = 0
+    latencies = []
+    submit_times = {}
+
+    def collect(results):
+        nonlocal n_detected
+        for _, frame_id, _, landmarks in results:
+            latencies.append(time.perf_counter() - submit_times.pop(frame_id))
+            n_detected += not np.isnan(landmarks[0, 0])
+
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        submit_times[client.submit(frame, n_frames * 1000.0 / fps)] = time.perf_counter()
+        n_frames += 1
+        collect(client.poll())
+    while submit_times:
+        collect([client.get()] + client.poll())
+    cap.release()
+    stats[client.camera_id] = (n_frames, n_detected, time.perf_counter() - start, latencies)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run several cameras/videos through one shared pose inference service.')
+    parser.add_argument('inputs', nargs='+', help='videos or camera indices, one per camera')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per camera)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2))
+    args = parser.parse_args()
+
+    cameras = {}
+    for camera_id, input_path in enumerate(args.inputs):
+        cap = cv2.VideoCapture(int(input_path) if input_path.isdigit() else input_path)
+        cameras[camera_id] = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), 3)
+        cap.release()
+
+    stats = {}
+    with PoseServer(cameras, n_workers=args.workers, model_complexity=args.model_complexity) as server:
+        producers = [threading.Thread(target=_produce, args=(server.clients[camera_id], input_path, stats))
+                     for camera_id, input_path in enumerate(args.inputs)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+
+    for camera_id, (n_frames, n_detected, elapsed, latencies) in sorted(stats.items()):
+        print('Camera {}: {} frames ({} with pose) at {:.1f} fps, submit -> result latency p50 {:.1f} ms'.format(
+            camera_id, n_frames, n_detected, n_frames / elapsed, np.percentile(np.array(latencies) * 1000, 50) if latencies else float('nan')))
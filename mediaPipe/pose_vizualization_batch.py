@@ -0,0 +1,95 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+
+import landmark_cache
+from pose_engine import create_pose_engine
+from pose_vizualization_video import annotate_video
+
+# Model settings of the worker processes, set by the pool initializer
+pose_settings = None
+
+
+def init_worker(settings):
+    global pose_settings
+    pose_settings = settings
+
+
+def annotate_file(paths):
+    # Returns (input_video_path, n_frames, elapsed, error); error is None on success
+    input_video_path, output_video_path, landmarks_path, cache_dir = paths
+    start = time.perf_counter()
+    pose = None
+    try:
+        # A fresh engine per video: the tracking state of one video must not seed the next one
+        # (not needed if the landmarks are cached)
+        if cache_dir is None or not landmark_cache.has_entry(landmark_cache.entry_path(cache_dir, input_video_path, pose_settings)):
+            pose = create_pose_engine( **pose_settings )
+        n_frames = annotate_video(input_video_path, output_video_path, pose, preview_every=0,
+                                  landmarks_path=landmarks_path, pose_settings=pose_settings, cache_dir=cache_dir)
+    except Exception as e:
+        return input_video_path, 0, time.perf_counter() - start, '{}: {}'.format(type(e).__name__, e)
+    finally:
+        if pose is not None:
+            pose.close()
+    return input_video_path, n_frames, time.perf_counter() - start, None
+
+
+def find_videos(input_path):
+    # Accept a directory (all .mp4 files in it) or a glob pattern
+    if os.path.isdir(input_path):
+        input_path = os.path.join(input_path, '*.mp4')
+    return sorted(glob.glob(input_path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Annotate a directory of videos with MediaPipe Pose in parallel.')
+    parser.add_argument('input', help="input directory (e.g. 'Input/test/constraint') or glob pattern (e.g. 'Input/*/constraint/*.mp4')")
+    parser.add_argument('output_dir', help='directory for the annotated videos')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes (default: all cores)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2), help='2 for heavy, 1 for full, and 0 for light')
+    parser.add_argument('--min-detection-confidence', type=float, default=0.5)
+    parser.add_argument('--min-tracking-confidence', type=float, default=0.5)
+    parser.add_argument('--cache-dir', nargs='?', const=landmark_cache.DEFAULT_CACHE_DIR, metavar='DIR',
+                        help='reuse landmarks of earlier runs with the same video and model settings (default DIR: %(const)s)')
+    parser.add_argument('--landmarks', action='store_true', help='also export the landmarks of every video to <output_dir>/<name>_landmarks')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    input_video_paths = find_videos(args.input)
+    if not input_video_paths:
+        print("Error: No videos found for '{}'.".format(args.input))
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = []
+    for input_video_path in input_video_paths:
+        name = os.path.splitext(os.path.basename(input_video_path))[0]
+        landmarks_path = os.path.join(args.output_dir, name + '_landmarks') if args.landmarks else None
+        jobs.append((input_video_path, os.path.join(args.output_dir, name + '_annotated.mp4'), landmarks_path, args.cache_dir))
+
+    start = time.perf_counter()
+    total_frames = 0
+    failed = []
+    settings = dict( model_complexity=args.model_complexity, min_detection_confidence=args.min_detection_confidence, min_tracking_confidence=args.min_tracking_confidence )
+    with multiprocessing.Pool(min(args.workers, len(jobs)), initializer=init_worker, initargs=(settings,)) as pool:
+        for input_video_path, n_frames, elapsed, error in pool.imap_unordered(annotate_file, jobs):
+            if error is not None:
+                print('Error: {} failed ({})'.format(input_video_path, error))
+                failed.append(input_video_path)
+                continue
+            total_frames += n_frames
+            print('{}: {} frames in {:.1f} s ({:.1f} fps)'.format(input_video_path, n_frames, elapsed, n_frames / max(elapsed, 1e-9)))
+    wall_time = time.perf_counter() - start
+
+    print('Processed {} videos ({} frames, {} failed) in {:.1f} s wall time ({:.1f} fps overall)'.format(
+        len(jobs) - len(failed), total_frames, len(failed), wall_time, total_frames / wall_time))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from landmark_sink import LandmarkSink
+from pose_engine import create_pose_engine
+from pose_pipeline import run_pipeline
+from pose_vizualization_video import draw_right_arm_landmarks
+from video_io import WRITER_BACKENDS, open_reader, open_writer
+
+
+def plan_chunks(n_frames, n_chunks, overlap=30):
+    # (warmup_start, start, end) per chunk: frames [warmup_start, start) only warm up the tracker,
+    # frames [start, end) are written. The last chunk reads to the end of the file (end None),
+    # since CAP_PROP_FRAME_COUNT is only an estimate for some containers.
+    n_chunks = max(1, min(n_chunks, n_frames))
+    bounds = np.linspace(0, n_frames, n_chunks + 1).astype(int)
+    chunks = []
+    for i in range(n_chunks):
+        start = int(bounds[i])
+        end = int(bounds[i + 1]) if i < n_chunks - 1 else None
+        chunks.append((max(0, start - overlap), start, end))
+    return chunks
+
+
+def seek(cap, frame_index):
+    # Seek with CAP_PROP_POS_FRAMES; fall back to grabbing forward if the backend lands elsewhere
+    if frame_index == 0:
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != frame_index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(frame_index):
+            if not cap.grab():
+                break
+
+
+class _FrameRange:
+    # Reader for run_pipeline that stops after n_frames (None: end of file)
+
+    def __init__(self, cap, n_frames):
+        self.cap = cap
+        self.n_left = n_frames
+
+    def read(self, image=None):
+        if self.n_left is not None:
+            if self.n_left <= 0:
+                return False, None
+            self.n_left -= 1
+        return self.cap.read(image)
+
+
+def annotate_chunk(job):
+    # Worker: annotate frames [start, end) of the input into its own segment, with a fresh tracker
+    input_video_path, segment_path, (warmup_start, start, end), pose_settings, encoder, encoder_options = job
+    begin = time.perf_counter()
+    cap = cv2.VideoCapture(input_video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    engine = create_pose_engine(running_mode='video', **pose_settings)
+    seek(cap, warmup_start)
+
+    image_rgb = None
+    frame_index = warmup_start
+
+    def process_frame(frame):
+        nonlocal image_rgb, frame_index
+        # Timestamps of the whole file, so they keep increasing from the warm-up into the chunk
+        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=image_rgb)
+        landmarks = engine.detect(image_rgb, frame_index * 1000.0 / (fps or 30.0))
+        frame_index += 1
+        return landmarks
+
+    # Tracker warm-up on the overlap (not written)
+    frame = None
+    for _ in range(start - warmup_start):
+        ret, frame = cap.read(frame)
+        if not ret:
+            break
+        process_frame(frame)
+
+    out = open_writer(segment_path, fps, (frame_width, frame_height), encoder, **(encoder_options or {}))
+    landmarks = []
+
+    def write_frame(frame, result):
+        landmarks.append(result)
+        out.write(draw_right_arm_landmarks(frame, result))
+
+    try:
+        n_frames = run_pipeline(_FrameRange(cap, None if end is None else end - start), process_frame, write_frame)
+    finally:
+        cap.release()
+        out.release()
+        engine.close()
+    landmarks = np.array(landmarks, np.float32).reshape(-1, 33, 4)
+    return start, n_frames, landmarks, time.perf_counter() - begin
+
+
+def _remux_segments(av, segment_paths, output_video_path):
+    # Copy the packets of all segments into one container, shifting their timestamps by the
+    # duration of the segments before (the segments share codec and settings)
+    output = av.open(output_video_path, mode='w')
+    out_stream = None
+    offset = 0  # seconds, as a Fraction
+    try:
+        for segment_path in segment_paths:
+            with av.open(segment_path) as segment:
+                stream = segment.streams.video[0]
+                if out_stream is None:
+                    out_stream = output.add_stream_from_template(stream)
+                shift = round(offset / stream.time_base) - (stream.start_time or 0)
+                end = 0
+                for packet in segment.demux(stream):
+                    if packet.dts is None:
+                        continue
+                    end = max(end, packet.pts + packet.duration)
+                    packet.pts += shift
+                    packet.dts += shift
+                    packet.stream = out_stream
+                    output.mux(packet)
+                offset += (end - (stream.start_time or 0)) * stream.time_base
+    finally:
+        output.close()
+
+
+def concat_segments(segment_paths, output_video_path, ffmpeg=None, encoder='opencv', encoder_options=None):
+    # The segments are joined without re-encoding: with the ffmpeg binary (concat demuxer) if one is
+    # given or on the PATH, otherwise by copying the packets with PyAV
+    ffmpeg = ffmpeg or shutil.which('ffmpeg')
+    if ffmpeg:
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            for segment_path in segment_paths:
+                f.write("file '{}'\n".format(os.path.abspath(segment_path).replace("'", "'\\''")))
+        try:
+            subprocess.run([ffmpeg, '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', f.name, '-c', 'copy', output_video_path], check=True)
+        finally:
+            os.remove(f.name)
+        return
+    try:
+        import av
+    except ImportError:
+        av = None
+    if av is not None:
+        _remux_segments(av, segment_paths, output_video_path)
+        return
+
+    # Last resort: decode and encode again (a second lossy, single-threaded pass)
+    print('Warning: neither ffmpeg nor PyAV found, re-encoding the segments to join them')
+    out = None
+    for segment_path in segment_paths:
+        reader = open_reader(segment_path)
+        if out is None:
+            out = open_writer(output_video_path, reader.fps, (reader.frame_width, reader.frame_height), encoder, **(encoder_options or {}))
+        frame = None
+        while True:
+            ret, frame = reader.read(frame)
+            if not ret:
+                break
+            out.write(frame)
+        reader.release()
+    if out is not None:
+        out.release()
+
+
+def annotate_video_chunked(input_video_path, output_video_path, pose_settings, n_workers=None, n_chunks=None, overlap=30,
+                           landmarks_path=None, ffmpeg=None, encoder='opencv', encoder_options=None):
+    """
+    Annotate one video with several worker processes: the video is split into n_chunks time
+    chunks, every worker seeks to its chunk (CAP_PROP_POS_FRAMES), warms up the tracker on
+    overlap frames before it and writes an annotated segment. Segments and landmarks are
+    stitched back in order. Returns the number of annotated frames.
+    """
+    n_workers = n_workers or os.cpu_count()
+    cap = cv2.VideoCapture(input_video_path)
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if n_frames <= 0:
+        raise ValueError('Could not read the frame count of {}'.format(input_video_path))
+
+    chunks = plan_chunks(n_frames, n_chunks or n_workers, overlap)
+    segment_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_video_path)))
+    segment_paths = [os.path.join(segment_dir, '{:04d}.mp4'.format(i)) for i in range(len(chunks))]
+    jobs = [(input_video_path, segment_path, chunk, pose_settings, encoder, encoder_options)
+            for segment_path, chunk in zip(segment_paths, chunks)]
+
+    results = []
+    try:
+        with multiprocessing.Pool(min(n_workers, len(jobs))) as pool:
+            for start, n_chunk_frames, landmarks, elapsed in pool.imap_unordered(annotate_chunk, jobs):
+                print('Chunk from frame {}: {} frames in {:.1f} s ({:.1f} fps)'.format(start, n_chunk_frames, elapsed, n_chunk_frames / elapsed))
+                results.append((start, landmarks))
+        concat_segments(segment_paths, output_video_path, ffmpeg, encoder, encoder_options)
+    finally:
+        for segment_path in segment_paths:
+            if os.path.exists(segment_path):
+                os.remove(segment_path)
+        os.rmdir(segment_dir)
+
+    # Stitch the landmark streams in frame order
+    results.sort(key=lambda result: result[0])
+    total_frames = sum(len(landmarks) for _, landmarks in results)
+    if landmarks_path is not None:
+        metadata = {'source': os.path.abspath(input_video_path), 'fps': fps, 'frame_width': frame_width, 'frame_height': frame_height,
+                    'chunks': [list(chunk) for chunk in chunks], 'overlap': overlap}
+        metadata.update(pose_settings)
+        with LandmarkSink(landmarks_path, metadata=metadata) as sink:
+            for start, landmarks in results:
+                for i, frame_landmarks in enumerate(landmarks):
+                    frame_index = start + i
+                    sink.append(frame_index, frame_index / fps if fps else 0.0, frame_landmarks)
+    return total_frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Annotate one long video with the right arm pose, split into chunks that are processed in parallel.')
+    parser.add_argument('input', help='input video')
+    parser.add_argument('output', help='annotated output video')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes (default: all cores)')
+    parser.add_argument('--chunks', type=int, help='number of time chunks (default: one per worker)')
+    parser.add_argument('--overlap', type=int, default=30, metavar='FRAMES', help='frames before each chunk used to warm up the tracker')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2), help='2 for heavy, 1 for full, and 0 for light')
+    parser.add_argument('--landmarks', metavar='DIR', help='also export the landmarks of every frame to DIR')
+    parser.add_argument('--ffmpeg', metavar='BINARY', help='ffmpeg binary to join the segments (default: ffmpeg on the PATH, else PyAV)')
+    parser.add_argument('--encoder', choices=WRITER_BACKENDS, default='opencv',
+                        help="encoder of the segments: 'opencv' (mp4v), 'pyav' or 'ffmpeg' (H.264, see video_io.py)")
+    args = parser.parse_args()
+
+    pose_settings = dict( model_complexity=args.model_complexity, min_detection_confidence=0.5, min_tracking_confidence=0.5 )
+    start = time.perf_counter()
+    n_frames = annotate_video_chunked(args.input, args.output, pose_settings, n_workers=args.workers, n_chunks=args.chunks,
+                                      overlap=args.overlap, landmarks_path=args.landmarks, ffmpeg=args.ffmpeg,
+                                      encoder=args.encoder)
+    wall_time = time.perf_counter() - start
+    print('Annotated {} frames in {:.1f} s wall time ({:.1f} fps)'.format(n_frames, wall_time, n_frames / wall_time))
@@ -1,61 +1,144 @@
-import mediapipe as mp
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import time
+
 import cv2
 import numpy as np
 
-def draw_landmarks_on_image( rgb_image, detection_result ):
-    annotated_image = np.copy( rgb_image )
-    
-    # Custom drawing specs for landmarks and connections
-    landmark_drawing_spec = mp.solutions.drawing_utils.DrawingSpec( color=(83, 88, 93), thickness=8, circle_radius=10 )
-    connection_drawing_spec = mp.solutions.drawing_utils.DrawingSpec( color=(255, 88, 0), thickness=8, circle_radius=10 )
+from landmark_sink import NUM_LANDMARKS
+from pose_drawing import POSE_CONNECTIONS, VISIBILITY_THRESHOLD, draw_pose
+from pose_engine import get_pose_engine
+from stage_timer import timer
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+# One engine per worker process (static images, no tracking), created by the pool initializer
+engine = None
+
+
+def draw_landmarks_on_image( bgr_image, landmarks ):
+    # Draws in place on the BGR image, so the colors are given as BGR
+    # Custom drawing specs for landmarks and connections (vectorized, see pose_drawing.py)
+    return draw_pose(bgr_image, landmarks, POSE_CONNECTIONS,
+                     landmark_color=(93, 88, 83), connection_color=(0, 88, 255), thickness=8, circle_radius=10,
+                     visibility_threshold=VISIBILITY_THRESHOLD, landmark_border=True, clip_to_image=True)
+
+
+def init_worker(engine_settings):
+    global engine
+    engine = get_pose_engine( running_mode='image', **engine_settings )
+
+
+def annotate_image(paths):
+    # Returns (image_path, image_shape, landmarks); image_shape is None if the image could not be read
+    image_path, output_path = paths
+
+    # Load the image using OpenCV (BGR)
+    with timer.stage('imread'):
+        image_bgr = cv2.imread( image_path )
+    if image_bgr is None:
+        return image_path, None, None
+
+    # Detect pose landmarks from the input image, MediaPipe expects RGB
+    with timer.stage('cvtColor'):
+        image_rgb = cv2.cvtColor( image_bgr, cv2.COLOR_BGR2RGB )
+    with timer.stage('inference'):
+        landmarks = engine.detect( image_rgb )
 
-    mp.solutions.drawing_utils.draw_landmarks(
-        annotated_image,
-        pose_results.pose_landmarks,
-        mp.solutions.pose.POSE_CONNECTIONS,
-        landmark_drawing_spec,
-        connection_drawing_spec)
-    return annotated_image
+    # Save an annotated copy (the input is never overwritten)
+    with timer.stage('draw'):
+        annotated_image = draw_landmarks_on_image( image_bgr, landmarks )
+    with timer.stage('imwrite'):
+        cv2.imwrite( output_path, annotated_image )
+    return image_path, image_bgr.shape, landmarks
 
 
+def annotate_image_timed(paths):
+    # annotate_image in a pool worker with --timing: the stage durations (s) of this image are
+    # returned, so the parent process can report them (each stage runs once per image)
+    timer.configure()
+    result = annotate_image(paths)
+    return result + ({name: float(durations[0]) for name, durations in timer.durations.items()},)
 
-# Load the input image from an image file.
-image_path = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/images/2_raw_annotated.jpg' 
 
-# Load the image using OpenCV.
-image_bgr = cv2.imread( image_path )
+def find_images(input_path):
+    # Accept a single image, a directory (all images in it) or a glob pattern
+    if os.path.isdir(input_path):
+        return sorted(os.path.join(input_path, name) for name in os.listdir(input_path)
+                      if name.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(glob.glob(input_path))
 
-# Check if the image is loaded properly
-if image_bgr is not None:
-    cv2.imshow( 'Image', image_bgr )
-    key = cv2.waitKey(0)  # Wait for a key press to close
-    if key == 13:         # 13 is the Enter key
-        cv2.destroyAllWindows()
-else:
-    print("Error: Image not found or unable to load.")
-    exit()
 
-# OpenCV reads images in BGR
-# Convert the image from BGR to RGB format
-image_rgb = cv2.cvtColor( image_bgr, cv2.COLOR_BGR2RGB )
+def table_header():
+    header = ['image', 'width', 'height', 'detected']
+    for i in range(NUM_LANDMARKS):
+        header += ['x{}'.format(i), 'y{}'.format(i), 'z{}'.format(i), 'visibility{}'.format(i)]
+    return header
 
-# MediaPipe pose processing
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose( model_complexity=2 )  # Use 2 for heavy, 1 for full, and 0 for light
 
-# Detect pose landmarks from the input image
-# MediaPipe expects RGB
-pose_results = pose.process( image_rgb )
+if __name__ == '__main__':
+    # Load the input image from an image file.
+    image_path = '/Users/johanneslachner/Documents/GIT_private/PoseTracking/images/2_raw_annotated.jpg'
 
-# Annotate original image and visualize it
-annotated_image = draw_landmarks_on_image( image_rgb, pose_results )
+    parser = argparse.ArgumentParser(description='Annotate still images with MediaPipe Pose in parallel (no GUI).')
+    parser.add_argument('input', nargs='?', default=image_path, help='image, directory of images or glob pattern')
+    parser.add_argument('output_dir', nargs='?', help='directory for the annotated copies (default: <input dir>/annotated)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes (default: all cores)')
+    parser.add_argument('--model-complexity', type=int, default=2, choices=(0, 1, 2), help='2 for heavy, 1 for full, and 0 for light')
+    parser.add_argument('--min-detection-confidence', type=float, default=0.5)
+    parser.add_argument('--engine', choices=('solutions', 'tasks'), default='solutions',
+                        help="'solutions': legacy mp.solutions.pose, 'tasks': PoseLandmarker in IMAGE mode (needs --model)")
+    parser.add_argument('--model', metavar='TASK_FILE', help='PoseLandmarker model for --engine tasks (pose_landmarker_heavy.task)')
+    parser.add_argument('--table', metavar='CSV', help='landmarks table of all images (default: <output_dir>/landmarks.csv)')
+    parser.add_argument('--timing', action='store_true', help='report p50/p95/p99 latency per stage over all workers')
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
 
-# Save the annotated image
-cv2.imwrite( image_path, cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR) )
+    image_paths = find_images(args.input)
+    if not image_paths:
+        print("Error: No images found for '{}'.".format(args.input))
+        raise SystemExit(1)
+    output_dir = args.output_dir or os.path.join(os.path.dirname(os.path.abspath(image_paths[0])), 'annotated')
+    os.makedirs(output_dir, exist_ok=True)
+    table_path = args.table or os.path.join(output_dir, 'landmarks.csv')
 
-# Show annotated image
-cv2.imshow('Annotated Image', cv2.cvtColor( annotated_image, cv2.COLOR_RGB2BGR ) )
-cv2.waitKey(0)
-cv2.destroyAllWindows()
+    jobs = []
+    for path in image_paths:
+        name, extension = os.path.splitext(os.path.basename(path))
+        jobs.append((path, os.path.join(output_dir, name + '_annotated' + extension)))
 
+    engine_settings = dict( engine=args.engine, model_asset_path=args.model, model_complexity=args.model_complexity,
+                            min_detection_confidence=args.min_detection_confidence )
+    if args.timing:
+        timer.configure()
+    start = time.perf_counter()
+    n_detected = 0
+    n_failed = 0
+    with open(table_path, 'w', newline='') as table_file, \
+            multiprocessing.Pool(min(args.workers, len(jobs)), initializer=init_worker, initargs=(engine_settings,)) as pool:
+        table = csv.writer(table_file)
+        table.writerow(table_header())
+        # Ordered results, so the table follows the (sorted) input
+        for result in pool.imap(annotate_image_timed if args.timing else annotate_image, jobs, chunksize=8):
+            path, shape, landmarks = result[:3]
+            if args.timing:
+                for name, duration in result[3].items():
+                    timer.record(name, 0.0, duration)
+            if shape is None:
+                print("Error: {} not found or unable to load.".format(path))
+                n_failed += 1
+                continue
+            detected = not np.isnan(landmarks[0, 0])
+            n_detected += detected
+            table.writerow([path, shape[1], shape[0], int(detected)] + ['{:.6g}'.format(value) for value in landmarks.ravel()])
+    wall_time = time.perf_counter() - start
 
+    n_images = len(jobs) - n_failed
+    print('Annotated {} images ({} with pose, {} unreadable) in {:.1f} s ({:.1f} images/s), landmarks in {}'.format(
+        n_images, n_detected, n_failed, wall_time, n_images / wall_time, table_path))
+    if args.timing:
+        timer.report()
@@ -1,88 +1,280 @@
+# First, so --profile-startup also measures the imports below
+import startup_profile
+
+import argparse
+import json
+import os
+import shutil
+
 import cv2
-import mediapipe as mp
-import numpy as np
-
-def draw_right_arm_landmarks(rgb_image, pose_results):
-    annotated_image = np.copy(rgb_image)
-    
-    # Initialize drawing specs
-    landmark_drawing_spec = mp.solutions.drawing_utils.DrawingSpec(color=(83, 88, 93), thickness=8, circle_radius=10)
-    #connection_drawing_spec = mp.solutions.drawing_utils.DrawingSpec(color=(0,191,255), thickness=8, circle_radius=10) #blue
-    connection_drawing_spec = mp.solutions.drawing_utils.DrawingSpec(color=(255, 88, 0), thickness=8, circle_radius=10) #orange
-    
-    # Right arm connections based on MediaPipe Pose landmark numbering
-    right_arm_connections = [
-        (12, 14),  # Right shoulder to right elbow
-        (14, 16),  # Right elbow to right wrist
-    ]
-    
-    if pose_results.pose_landmarks:
-        # Draw each connection
-        for connection in right_arm_connections:
-            start_idx, end_idx = connection
-            start_landmark = pose_results.pose_landmarks.landmark[start_idx]
-            end_landmark = pose_results.pose_landmarks.landmark[end_idx]
-            cv2.line(annotated_image, 
-                     (int(start_landmark.x * annotated_image.shape[1]), int(start_landmark.y * annotated_image.shape[0])), 
-                     (int(end_landmark.x * annotated_image.shape[1]), int(end_landmark.y * annotated_image.shape[0])), 
-                     connection_drawing_spec.color, connection_drawing_spec.thickness)
-        
-        # Draw each landmark
-        for idx in [11, 12, 14, 16]:  # Right shoulder, elbow, and wrist
-            landmark = pose_results.pose_landmarks.landmark[idx]
-            cv2.circle(annotated_image, 
-                       (int(landmark.x * annotated_image.shape[1]), int(landmark.y * annotated_image.shape[0])), 
-                       landmark_drawing_spec.circle_radius, landmark_drawing_spec.color, landmark_drawing_spec.thickness)
-    
-    return annotated_image
-
-
-# File paths
-input_video_path = '/Users/johanneslachner/Documents/InMotion_Tracking/Input/test/constraint/constraint2.mp4'  # Update this path to your video path
-output_video_path = '/Users/johanneslachner/Documents/InMotion_Tracking/Output/test/constraint/constraint2_annotated.mp4'  # Change to AVI format
-
-
-# Initialize MediaPipe Pose.
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose( model_complexity=2, min_detection_confidence=0.5, min_tracking_confidence=0.5 )
-
-# Initialize video capture and writer
-cap = cv2.VideoCapture(input_video_path)
-
-# Video writer
-fourcc = cv2.VideoWriter_fourcc( *'mp4v' )  # or 'XVID'
-fps = cap.get(cv2.CAP_PROP_FPS)
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-out = cv2.VideoWriter(output_video_path, fourcc, fps, (frame_width, frame_height))
-
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Convert the frame from BGR to RGB
-    image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Process the frame
-    pose_results = pose.process(image_rgb)
-
-    # Draw the pose annotation on the frame
-    annotated_image = draw_right_arm_landmarks(image_rgb, pose_results)
-
-    # Convert back to BGR for displaying and writing
-    annotated_image_bgr = cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR)
-
-    # Display the frame
-    cv2.imshow('MediaPipe Pose', annotated_image_bgr)
-
-    # Write the frame
-    out.write(annotated_image_bgr)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Release everything
-cap.release()
-out.release()
-cv2.destroyAllWindows()
+
+import landmark_cache
+from complexity_autotune import autotune_complexity
+from frame_skipping import KeyframeInterpolator
+from landmark_sink import LandmarkSink, landmarks_to_array, load_landmarks
+from landmark_smoothing import SMOOTHING_METHODS, create_filter
+from pose_drawing import RIGHT_ARM_CONNECTIONS, RIGHT_ARM_LANDMARKS, draw_pose
+from pose_engine import as_engine, get_pose_engine
+from pose_pipeline import run_pipeline
+from roi_tracking import RoiPose
+from stage_timer import timer
+from video_io import READER_BACKENDS, WRITER_BACKENDS, open_reader, open_writer
+
+def draw_right_arm_landmarks(bgr_image, landmarks):
+    # Draws in place on the BGR frame, so the colors are given as BGR
+    # landmarks: (33, 4) array from landmark_sink.landmarks_to_array (NaN if no pose was detected)
+
+    # Right shoulder -> elbow -> wrist, drawn in one polylines call (see pose_drawing.py)
+    return draw_pose(bgr_image, landmarks, RIGHT_ARM_CONNECTIONS, RIGHT_ARM_LANDMARKS,
+                     landmark_color=(93, 88, 83), connection_color=(0, 88, 255),  # orange, blue: (255, 191, 0)
+                     thickness=8, circle_radius=10)
+
+
+def annotate_video(input_video_path, output_video_path, pose, queue_size=8, preview_every=1, landmarks_path=None, pose_settings=None, cache_dir=None,
+                   skip=1, max_velocity=None, metadata=None, decoder='opencv', encoder='opencv', decoder_options=None, encoder_options=None, threads=0,
+                   smoothing=None):
+    # preview_every:  show every Nth annotated frame, 0 runs headless (no cv2.imshow/waitKey at all)
+    # landmarks_path: optional directory to store the landmarks of every frame (see landmark_sink.py)
+    # pose_settings:  model settings of pose, stored in the landmark metadata and part of the cache key
+    # cache_dir:      reuse landmarks from an earlier run with the same video and settings (pose is not used on a hit)
+    # skip:           run inference on every Kth frame and interpolate in between (see frame_skipping.py)
+    # max_velocity:   with skip, run inference on every frame while the landmarks move faster than this
+    # metadata:       extra entries for the landmark metadata that are not part of the cache key
+    # decoder/encoder: video I/O backends 'opencv', 'pyav' or 'ffmpeg' (see video_io.py)
+    # decoder_options/encoder_options: backend options, e.g. preset and crf for the H.264 encoders
+    # threads:        decoder threads (0: automatic)
+    # smoothing:      landmark filter applied in frame order (see landmark_smoothing.py), not applied to cached landmarks
+    # pose is a pose engine (see pose_engine.py), an mp.solutions.pose.Pose instance or a RoiPose
+    # (see roi_tracking.py) to run inference on a crop around the subject
+
+    # Initialize video capture and writer
+    cap = open_reader(input_video_path, decoder, threads=threads, **(decoder_options or {}))
+    if not cap.isOpened():
+        raise OSError('Could not open video {}'.format(input_video_path))
+    fps = cap.fps
+    frame_width = cap.frame_width
+    frame_height = cap.frame_height
+
+    # Video writer (opencv: mp4v, pyav/ffmpeg: H.264)
+    out = open_writer(output_video_path, fps, (frame_width, frame_height), encoder, **(encoder_options or {}))
+
+    # Landmark cache and export
+    sink_metadata = {'source': os.path.abspath(input_video_path), 'fps': fps, 'frame_width': frame_width, 'frame_height': frame_height}
+    sink_metadata.update(pose_settings or {})
+    sink_metadata.update(metadata or {})
+    sink = None
+    cached_landmarks = None
+    if cache_dir is not None:
+        cache_entry = landmark_cache.entry_path(cache_dir, input_video_path, pose_settings, decoder)
+        cached_landmarks = landmark_cache.load(cache_entry)
+        if cached_landmarks is None:
+            sink = landmark_cache.CacheSink(cache_entry, metadata=sink_metadata)
+    elif landmarks_path is not None:
+        sink = LandmarkSink(landmarks_path, metadata=sink_metadata)
+
+    # Inference stage: runs in its own thread while the next frames are decoded
+    inference_index = 0
+    image_rgb = None
+    engine = pose if pose is None or isinstance(pose, RoiPose) else as_engine(pose)
+
+    def detect(frame, frame_index):
+        nonlocal image_rgb
+        # Video-mode engines track between frames based on the timestamp
+        timestamp_ms = frame_index * 1000.0 / (fps or 30.0)
+        if isinstance(engine, RoiPose):
+            # Crop, downscale and convert only the region of interest
+            with timer.stage('inference'):
+                return engine.detect(frame, timestamp_ms)
+        # Convert the frame from BGR to RGB into a reused buffer (detection is synchronous)
+        with timer.stage('cvtColor'):
+            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=image_rgb)
+        with timer.stage('inference'):
+            return engine.detect(image_rgb, timestamp_ms)
+
+    def process_single_frame(frame):
+        nonlocal inference_index
+        # Process the frame (or only look up the landmarks on a cache hit)
+        if cached_landmarks is not None:
+            landmarks = cached_landmarks[inference_index] if inference_index < len(cached_landmarks) else landmarks_to_array(None)
+        else:
+            landmarks = detect(frame, inference_index)
+        inference_index += 1
+        return landmarks
+
+    # Keyframe inference: frames are held back until the next keyframe to interpolate them
+    interpolator = None
+    if skip > 1 and cached_landmarks is None:
+        interpolator = KeyframeInterpolator(detect, skip=skip, max_velocity=max_velocity)
+
+    def process_keyframes(frame):
+        return interpolator.flush() if frame is None else interpolator.push(frame)
+
+    process_frame = process_single_frame if interpolator is None else process_keyframes
+
+    # Annotate/encode stage: runs in the main thread (required by cv2.imshow)
+    frame_index = 0
+    stopped = False
+
+    def write_frame(frame, result):
+        nonlocal frame_index, stopped
+        landmarks = result
+
+        # Temporal smoothing (cached landmarks are already smoothed)
+        if smoothing is not None and cached_landmarks is None:
+            with timer.stage('smoothing'):
+                landmarks = smoothing.filter(landmarks, frame_index / fps if fps else None)
+
+        # Store the landmarks
+        if sink:
+            with timer.stage('sink'):
+                sink.append(frame_index, frame_index / fps if fps else 0.0, landmarks)
+
+        # Draw the pose annotation directly on the BGR frame (no copies)
+        with timer.stage('draw'):
+            annotated_image_bgr = draw_right_arm_landmarks(frame, landmarks)
+
+        # Write the frame
+        with timer.stage('encode'):
+            out.write(annotated_image_bgr)
+        if frame_index == 0:
+            startup_profile.mark('first frame')
+
+        # Display (a decimated subset of) the frames
+        frame_index += 1
+        if preview_every and frame_index % preview_every == 0:
+            with timer.stage('preview'):
+                cv2.imshow('MediaPipe Pose', annotated_image_bgr)
+                key = cv2.waitKey(1)
+            if key & 0xFF == ord('q'):
+                stopped = True
+                return False
+
+    completed = False
+    try:
+        n_frames = run_pipeline(cap, process_frame, write_frame, queue_size=queue_size, many=interpolator is not None)
+        completed = not stopped
+    finally:
+        # Release everything
+        cap.release()
+        out.release()
+        if isinstance(sink, landmark_cache.CacheSink):
+            # Only complete runs become cache entries
+            if completed:
+                sink.commit()
+            else:
+                sink.discard()
+        elif sink:
+            sink.close()
+        if preview_every:
+            cv2.destroyAllWindows()
+
+    # Export the cached landmarks
+    if cache_dir is not None and landmarks_path is not None and landmark_cache.has_entry(cache_entry):
+        shutil.copytree(cache_entry, landmarks_path, dirs_exist_ok=True)
+    return n_frames
+
+
+if __name__ == '__main__':
+    startup_profile.mark('imports')
+
+    # File paths
+    input_video_path = '/Users/johanneslachner/Documents/InMotion_Tracking/Input/test/constraint/constraint2.mp4'  # Update this path to your video path
+    output_video_path = '/Users/johanneslachner/Documents/InMotion_Tracking/Output/test/constraint/constraint2_annotated.mp4'  # Change to AVI format
+
+    parser = argparse.ArgumentParser(description='Annotate a video with the right arm pose.')
+    parser.add_argument('input', nargs='?', default=input_video_path, help='input video')
+    parser.add_argument('output', nargs='?', default=output_video_path, help='annotated output video')
+    parser.add_argument('--headless', action='store_true', help='do not open a preview window (for servers without display)')
+    parser.add_argument('--preview-every', type=int, default=1, metavar='N', help='only show every Nth frame in the preview window')
+    parser.add_argument('--landmarks', metavar='DIR', help='also export the landmarks of every frame to DIR')
+    parser.add_argument('--cache-dir', nargs='?', const=landmark_cache.DEFAULT_CACHE_DIR, metavar='DIR',
+                        help='reuse landmarks of earlier runs with the same video and model settings (default DIR: %(const)s)')
+    parser.add_argument('--engine', choices=('solutions', 'tasks'), default='solutions',
+                        help="'solutions': legacy mp.solutions.pose, 'tasks': PoseLandmarker in VIDEO mode (needs --model)")
+    parser.add_argument('--model', metavar='TASK_FILE', help='PoseLandmarker model for --engine tasks (pose_landmarker_heavy.task)')
+    parser.add_argument('--target-fps', type=float, help='benchmark model_complexity 2/1/0 on the first frames (with --roi/--skip) and use the heaviest that reaches this fps '
+                                                       '(recorded in <output>_metadata.json)')
+    parser.add_argument('--skip', type=int, default=1, metavar='K', help='run inference on every Kth frame and interpolate the landmarks in between')
+    parser.add_argument('--max-velocity', type=float, help='with --skip, run inference on every frame while landmarks move faster (normalized units per frame)')
+    parser.add_argument('--roi', action='store_true', help='run inference on a crop around the previous pose instead of the full frame')
+    parser.add_argument('--roi-size', type=int, default=640, help='longest side of the (downscaled) crop passed to MediaPipe')
+    parser.add_argument('--roi-redetect-every', type=int, default=60, metavar='N', help='search the full frame every N frames')
+    parser.add_argument('--decoder', choices=READER_BACKENDS, default='opencv', help='video decoder backend (see video_io.py)')
+    parser.add_argument('--encoder', choices=WRITER_BACKENDS, default='opencv', help="video encoder backend, 'pyav' and 'ffmpeg' write H.264")
+    parser.add_argument('--preset', default='veryfast', help='x264 preset for the pyav and ffmpeg encoders')
+    parser.add_argument('--crf', type=int, default=23, help='x264 quality for the pyav and ffmpeg encoders (lower is better)')
+    parser.add_argument('--threads', type=int, default=0, help='decoder/encoder threads (0: automatic)')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg binary for the ffmpeg decoder/encoder')
+    parser.add_argument('--smooth', choices=SMOOTHING_METHODS, help='temporal landmark smoothing before drawing and export')
+    parser.add_argument('--timing', action='store_true', help='report p50/p95/p99 latency per pipeline stage')
+    parser.add_argument('--trace', metavar='JSON', help='also write a Chrome trace of all stages (chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--profile-startup', action='store_true', help='report import and model load times until the first frame')
+    args = parser.parse_args()
+    if args.target_fps and args.engine == 'tasks':
+        parser.error('--target-fps benchmarks the solutions models (model_complexity), not a --model .task file')
+
+    model_settings = dict( model_complexity=2, min_detection_confidence=0.5, min_tracking_confidence=0.5 )
+    metadata = {}
+    pose_settings = dict( model_settings )
+    if args.target_fps:
+        # The complexity is only known after the benchmark: cache by the target instead, so a hit skips it
+        pose_settings.update( model_complexity='auto', target_fps=args.target_fps )
+    if args.engine == 'tasks':
+        pose_settings.update( engine='tasks', model=os.path.basename(args.model or '') )
+    if args.roi:
+        pose_settings['roi'] = dict( max_size=args.roi_size, redetect_every=args.roi_redetect_every )
+        # The crops are detected independently (the crop box follows the previous pose instead of MediaPipe's tracker)
+        pose_settings['running_mode'] = 'image'
+    if args.skip > 1:
+        pose_settings['skip'] = dict( skip=args.skip, max_velocity=args.max_velocity )
+    if args.smooth:
+        pose_settings['smoothing'] = args.smooth
+
+    encoder_options = {}
+    if args.encoder != 'opencv':
+        encoder_options = dict( preset=args.preset, crf=args.crf, threads=args.threads )
+    if args.encoder == 'ffmpeg':
+        encoder_options['ffmpeg'] = args.ffmpeg
+    decoder_options = dict( ffmpeg=args.ffmpeg ) if args.decoder == 'ffmpeg' else {}
+
+    if args.timing or args.trace:
+        timer.configure(trace=bool(args.trace))
+
+    cache_hit = args.cache_dir is not None and landmark_cache.has_entry(landmark_cache.entry_path(args.cache_dir, args.input, pose_settings, args.decoder))
+    if args.target_fps:
+        if cache_hit:
+            # Choice of the run that filled the cache
+            metadata['autotune'] = load_landmarks(landmark_cache.entry_path(args.cache_dir, args.input, pose_settings, args.decoder))[3].get('autotune')
+            model_settings['model_complexity'] = metadata['autotune']['model_complexity']
+            print('Cached landmarks, auto-tuned model_complexity={} (not benchmarked again)'.format( model_settings['model_complexity'] ))
+        else:
+            model_settings['model_complexity'], metadata['autotune'] = autotune_complexity( args.input, args.target_fps,
+                                                                                           roi=pose_settings.get('roi'), skip=pose_settings.get('skip') )
+            print('Auto-tuned model_complexity={}'.format( model_settings['model_complexity'] ))
+        metadata['model_complexity'] = model_settings['model_complexity']
+
+        # Also record the choice next to the annotated video, the landmark export is optional
+        run_metadata = dict( pose_settings, source=os.path.abspath(args.input) )
+        run_metadata.update( metadata )
+        with open(os.path.splitext(args.output)[0] + '_metadata.json', 'w') as f:
+            json.dump(run_metadata, f, indent=2)
+
+    # Initialize MediaPipe Pose (not needed if the landmarks are cached)
+    pose = None
+    if not cache_hit:
+        pose = get_pose_engine( args.engine, args.model, running_mode='image' if args.roi else 'video', **model_settings )
+        if args.roi:
+            pose = RoiPose( pose, **pose_settings['roi'] )
+
+    annotate_video(args.input, args.output, pose, preview_every=0 if args.headless else args.preview_every,
+                   landmarks_path=args.landmarks, pose_settings=pose_settings, cache_dir=args.cache_dir,
+                   skip=args.skip, max_velocity=args.max_velocity, metadata=metadata,
+                   decoder=args.decoder, encoder=args.encoder,
+                   decoder_options=decoder_options, encoder_options=encoder_options, threads=args.threads,
+                   smoothing=create_filter(args.smooth) if args.smooth else None)
+    if args.timing or args.trace:
+        timer.report()
+    if args.trace:
+        timer.write_chrome_trace(args.trace)
+    if args.profile_startup:
+        startup_profile.report()
@@ -1,56 +1,144 @@
+# First, so --profile-startup also measures the imports below
+import startup_profile
+
+import argparse
+import time
+
 import cv2
-import mediapipe as mp
+import numpy as np
+
+from landmark_smoothing import SMOOTHING_METHODS, create_filter
+from pose_drawing import POSE_CONNECTIONS, VISIBILITY_THRESHOLD, draw_pose
+from pose_engine import as_engine, get_pose_engine
+from pose_pipeline import LatestFrameCapture
+from stage_timer import timer
 
-def draw_landmarks_on_image(rgb_image, pose_results):
+def draw_landmarks_on_image(rgb_image, landmarks):
     annotated_image = rgb_image.copy()
 
-    # Custom drawing specs for landmarks and connections
-    landmark_drawing_spec = mp.solutions.drawing_utils.DrawingSpec( color=(83, 88, 93), thickness=8, circle_radius=10 )
-    connection_drawing_spec = mp.solutions.drawing_utils.DrawingSpec( color=(255, 88, 0), thickness=8, circle_radius=10 )
+    # Custom drawing specs for landmarks and connections (vectorized, see pose_drawing.py)
+    return draw_pose(annotated_image, landmarks, POSE_CONNECTIONS,
+                     landmark_color=(83, 88, 93), connection_color=(255, 88, 0), thickness=8, circle_radius=10,
+                     visibility_threshold=VISIBILITY_THRESHOLD, landmark_border=True, clip_to_image=True)
+
+
+def run_webcam(pose, camera_index=0, preview_every=1, latest_frame=True, smoothing=None):
+    # pose:          pose engine (see pose_engine.py) or mp.solutions.pose.Pose instance; a live-stream
+    #                engine gets the frames submitted without waiting for their result
+    # preview_every: show every Nth annotated frame, 0 runs headless (stop with Ctrl+C)
+    # latest_frame:  capture in a background thread and always process the newest frame (drops stale ones)
+    # smoothing:     streaming landmark filter (see landmark_smoothing.py)
+    # camera_index can also be a video file (e.g. for benchmarks); returns the number of processed frames
+    engine = as_engine(pose)
+
+    # Start capturing video input from the camera.
+    cap = cv2.VideoCapture(camera_index)  # '0' is typically the default camera.
+
+    if not cap.isOpened():
+        print("Error: Could not open webcam.")
+        return 0
+    if latest_frame:
+        cap = LatestFrameCapture(cap)
+
+    # Capture -> display latency per frame
+    latencies = []
+
+    frame_index = 0
+    try:
+        while cap.isOpened():
+            if latest_frame:
+                ret, frame, capture_time = cap.read()
+            else:
+                with timer.stage('capture'):
+                    ret, frame = cap.read()
+                capture_time = time.perf_counter()
+            if not ret:
+                print("Error: Failed to capture frame.")
+                break
 
-    mp.solutions.drawing_utils.draw_landmarks(
-        annotated_image,
-        pose_results.pose_landmarks,
-        mp.solutions.pose.POSE_CONNECTIONS,
-        landmark_drawing_spec,
-        connection_drawing_spec)
-    return annotated_image
+            # Convert the frame from BGR to RGB.
+            with timer.stage('cvtColor'):
+                image_rgb = cv2.cvtColor( frame, cv2.COLOR_BGR2RGB )
 
+            # Process the image and detect pose landmarks.
+            timestamp_ms = int( capture_time * 1000 )
+            with timer.stage('inference'):
+                if engine.live:
+                    # Non-blocking: draw the newest result that is available
+                    engine.submit( image_rgb, timestamp_ms )
+                    _, landmarks = engine.latest()
+                else:
+                    landmarks = engine.detect( image_rgb, timestamp_ms )
+            if smoothing is not None:
+                with timer.stage('smoothing'):
+                    landmarks = smoothing.filter( landmarks, capture_time )
 
+            if frame_index == 0:
+                startup_profile.mark('first frame')
+            frame_index += 1
+            if not preview_every or frame_index % preview_every != 0:
+                latencies.append(time.perf_counter() - capture_time)
+                continue
 
-# Initialize MediaPipe Pose.
-mp_pose = mp.solutions.pose
-pose = mp_pose.Pose( model_complexity=2 )  # Use 2 for heavy, 1 for full, and 0 for light
+            # Draw landmarks on the original frame.
+            with timer.stage('draw'):
+                annotated_image = draw_landmarks_on_image(frame, landmarks)
 
-# Start capturing video input from the camera.
-cap = cv2.VideoCapture(0)  # '0' is typically the default camera.
+            # Display the annotated image.
+            with timer.stage('display'):
+                cv2.imshow('MediaPipe Pose', annotated_image)
+            latencies.append(time.perf_counter() - capture_time)
 
-if not cap.isOpened():
-    print("Error: Could not open webcam.")
-    exit()
+            # Break the loop if 'q' is pressed.
+            with timer.stage('waitKey'):
+                key = cv2.waitKey(1)
+            if key & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Release the webcam and close OpenCV window.
+        cap.release()
+        if preview_every:
+            cv2.destroyAllWindows()
 
-while cap.isOpened():
-    ret, frame = cap.read()
-    if not ret:
-        print("Error: Failed to capture frame.")
-        break
+    if latencies:
+        latencies_ms = np.array(latencies) * 1000
+        print('Capture -> display latency over {} frames: p50 {:.1f} ms, p95 {:.1f} ms, max {:.1f} ms'.format(
+            len(latencies_ms), np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 95), latencies_ms.max()))
+        if latest_frame:
+            print('Dropped {} stale frames'.format(cap.n_dropped))
+    return frame_index
 
-    # Convert the frame from BGR to RGB.
-    image_rgb = cv2.cvtColor( frame, cv2.COLOR_BGR2RGB )
 
-    # Process the image and detect pose landmarks.
-    pose_results = pose.process( image_rgb )
+if __name__ == '__main__':
+    startup_profile.mark('imports')
 
-    # Draw landmarks on the original frame.
-    annotated_image = draw_landmarks_on_image(frame, pose_results)
+    parser = argparse.ArgumentParser(description='Live pose tracking from a webcam.')
+    parser.add_argument('--camera', type=int, default=0, help='camera index')
+    parser.add_argument('--headless', action='store_true', help='do not open a preview window (for servers without display)')
+    parser.add_argument('--preview-every', type=int, default=1, metavar='N', help='only annotate and show every Nth frame')
+    parser.add_argument('--engine', choices=('solutions', 'tasks'), default='solutions',
+                        help="'solutions': legacy mp.solutions.pose, 'tasks': PoseLandmarker in LIVE_STREAM mode (needs --model)")
+    parser.add_argument('--model', metavar='TASK_FILE', help='PoseLandmarker model for --engine tasks (pose_landmarker_heavy.task)')
+    parser.add_argument('--all-frames', action='store_true', help='process every captured frame instead of only the newest one (adds lag)')
+    parser.add_argument('--smooth', choices=SMOOTHING_METHODS, help='temporal landmark smoothing (streaming)')
+    parser.add_argument('--timing', action='store_true', help='report p50/p95/p99 latency per pipeline stage')
+    parser.add_argument('--trace', metavar='JSON', help='also write a Chrome trace of all stages (chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--profile-startup', action='store_true', help='report import and model load times until the first frame')
+    args = parser.parse_args()
 
-    # Display the annotated image.
-    cv2.imshow('MediaPipe Pose', annotated_image)
+    if args.timing or args.trace:
+        timer.configure(trace=bool(args.trace))
 
-    # Break the loop if 'q' is pressed.
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+    # Initialize MediaPipe Pose.
+    pose = get_pose_engine( args.engine, args.model, running_mode='live_stream', model_complexity=2 )  # Use 2 for heavy, 1 for full, and 0 for light
 
-# Release the webcam and close OpenCV window.
-cap.release()
-cv2.destroyAllWindows()
+    run_webcam(pose, args.camera, preview_every=0 if args.headless else args.preview_every, latest_frame=not args.all_frames,
+               smoothing=create_filter(args.smooth) if args.smooth else None)
+    if args.timing or args.trace:
+        timer.report()
+    if args.trace:
+        timer.write_chrome_trace(args.trace)
+    if args.profile_startup:
+        startup_profile.report()
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+from landmark_sink import landmarks_to_array
+from pose_engine import as_engine
+
+
+class RoiPose:
+    """
+    Runs pose inference on a downscaled crop around the subject instead of the full frame.
+
+    The crop box is derived from the landmarks of the previous frame (plus padding). Every
+    redetect_every frames, and whenever the pose is lost in the crop, the full (downscaled)
+    frame is searched again. Landmarks are mapped back to full-frame normalized coordinates.
+
+    The crop moves every frame, so the engine must not track between images: MediaPipe's
+    internal ROI assumes the same image coordinates in every frame. RoiPose does the tracking
+    itself and needs an engine in running_mode 'image' (static_image_mode for solutions).
+
+    pose:           pose engine in running_mode 'image' (see pose_engine.py)
+    padding:        box padding, as a fraction of the landmark extent
+    max_size:       longest side of the image passed to the engine (0 keeps the resolution)
+    redetect_every: run a full-frame detection every N frames (0 never forces one)
+    """
+
+    def __init__(self, pose, padding=0.3, max_size=640, redetect_every=60, min_visibility=0.5):
+        self.engine = as_engine(pose)
+        if self.engine.running_mode != 'image':
+            raise ValueError("RoiPose needs a pose engine in running_mode 'image', got {!r}".format(self.engine.running_mode))
+        self.padding = padding
+        self.max_size = max_size
+        self.redetect_every = redetect_every
+        self.min_visibility = min_visibility
+        self.box = None
+        self.n_frames = 0
+
+    def _infer(self, frame, box):
+        # Crop (BGR), downscale and convert only the crop to RGB
+        x0, y0, x1, y1 = box
+        crop = frame[y0:y1, x0:x1]
+        scale = min(1.0, self.max_size / max(crop.shape[:2])) if self.max_size else 1.0
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, round(crop.shape[1] * scale)), max(1, round(crop.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        crop_rgb = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
+        landmarks = self.engine.detect(crop_rgb)
+        if np.isnan(landmarks[0, 0]):
+            return None
+
+        # Crop-normalized -> full-frame normalized coordinates (z uses the same scale as x)
+        height, width = frame.shape[:2]
+        crop_width, crop_height = x1 - x0, y1 - y0
+        landmarks[:, 0] = (landmarks[:, 0] * crop_width + x0) / width
+        landmarks[:, 1] = (landmarks[:, 1] * crop_height + y0) / height
+        landmarks[:, 2] *= crop_width / width
+        return landmarks
+
+    def _box_from_landmarks(self, landmarks, shape):
+        height, width = shape[:2]
+        visible = landmarks[:, 3] >= self.min_visibility
+        points = landmarks[visible if visible.sum() >= 2 else slice(None), :2] * (width, height)
+        (x0, y0), (x1, y1) = points.min(axis=0), points.max(axis=0)
+        pad = self.padding * max(x1 - x0, y1 - y0)
+        x0, y0 = max(0, int(x0 - pad)), max(0, int(y0 - pad))
+        x1, y1 = min(width, int(x1 + pad) + 1), min(height, int(y1 + pad) + 1)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
+
+    def detect(self, frame, timestamp_ms=None):
+        # frame: full BGR frame; returns a (33, 4) landmark array (NaN if no pose was detected).
+        # timestamp_ms is not needed by image-mode engines, it is accepted for the engine interface
+        height, width = frame.shape[:2]
+        full_frame = (0, 0, width, height)
+        redetect = self.redetect_every and self.n_frames % self.redetect_every == 0
+        self.n_frames += 1
+
+        landmarks = None
+        if self.box is not None and not redetect:
+            landmarks = self._infer(frame, self.box)
+        if landmarks is None:
+            landmarks = self._infer(frame, full_frame)
+        if landmarks is None:
+            self.box = None
+            return landmarks_to_array(None)
+
+        self.box = self._box_from_landmarks(landmarks, frame.shape)
+        return landmarks
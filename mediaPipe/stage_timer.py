@@ -0,0 +1,113 @@
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class _NullSpan:
+    # Shared no-op context manager, so disabled timing costs one method call per stage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class StageTimer:
+    """
+    Per-stage wall-clock timers for the pose pipeline.
+
+        with timer.stage('inference'):
+            landmarks = engine.detect(image_rgb, timestamp_ms)
+
+    Every stage keeps its last `capacity` durations in a ring buffer for the p50/p95/p99
+    summary. With trace, spans are also kept (up to max_events) for write_chrome_trace().
+    Disabled (the default), stage() returns a shared no-op context manager.
+    """
+
+    def __init__(self, enabled=False, capacity=4096, trace=False, max_events=1000000):
+        self.capacity = capacity
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.configure(enabled, trace)
+
+    def configure(self, enabled=True, trace=False):
+        with self.lock:
+            self.enabled = enabled
+            self.trace = trace
+            self.durations = {}
+            self.counts = collections.Counter()
+            self.events = collections.deque(maxlen=self.max_events)
+            self.origin = time.perf_counter()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        with self.lock:
+            buffer = self.durations.get(name)
+            if buffer is None:
+                buffer = self.durations[name] = np.empty(self.capacity, np.float64)
+            buffer[self.counts[name] % self.capacity] = end - start
+            self.counts[name] += 1
+            if self.trace:
+                self.events.append((name, threading.get_ident(), start, end))
+
+    def summary(self):
+        # Per stage: number of calls and mean/p50/p95/p99 (ms) over the last `capacity` calls
+        with self.lock:
+            stages = {name: (self.counts[name], buffer[:min(self.counts[name], self.capacity)] * 1000)
+                      for name, buffer in self.durations.items()}
+        summary = {}
+        for name, (count, durations_ms) in stages.items():
+            p50, p95, p99 = np.percentile(durations_ms, (50, 95, 99))
+            summary[name] = {'count': count, 'mean_ms': float(durations_ms.mean()),
+                             'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+        return summary
+
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print('{:<12} {:>7} {:>9} {:>9} {:>9} {:>9}'.format('stage', 'calls', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, stats in summary.items():
+            print('{:<12} {count:>7} {mean_ms:>9.2f} {p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f}'.format(name, **stats))
+
+    def write_chrome_trace(self, path):
+        # Trace Event Format, open in chrome://tracing or https://ui.perfetto.dev
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                  'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6}
+                 for name, tid, start, end in events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+
+
+# Shared timer of the scripts, enabled with --timing/--trace
+timer = StageTimer()
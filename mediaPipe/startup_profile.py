@@ -0,0 +1,51 @@
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+
+# Import this module first in a script, so the stages below are measured from (almost) process start
+_START = time.perf_counter()
+
+# Time until the first processed frame that is considered acceptable (seconds)
+STARTUP_BUDGET = 2.0
+
+# (name, seconds) in the order the stages ran
+stages = []
+_last_mark = _START
+
+
+@contextmanager
+def stage(name):
+    global _last_mark
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _last_mark = time.perf_counter()
+        stages.append((name, _last_mark - start))
+
+
+def mark(name):
+    # Time since the previous stage or mark, e.g. mark('imports') at the start of main
+    global _last_mark
+    now = time.perf_counter()
+    stages.append((name, now - _last_mark))
+    _last_mark = now
+
+
+def import_module(name):
+    # Import on first use; only the first (real) import is recorded
+    if name in sys.modules:
+        return sys.modules[name]
+    with stage('import ' + name):
+        return importlib.import_module(name)
+
+
+def report(budget=STARTUP_BUDGET, file=None):
+    # Total up to the last recorded stage, so a report at exit does not count the processing itself
+    file = file or sys.stderr
+    total = _last_mark - _START
+    print('Startup profile:', file=file)
+    for name, seconds in stages:
+        print('  {:<24} {:7.3f} s'.format(name, seconds), file=file)
+    print('  {:<24} {:7.3f} s ({} the {:.1f} s budget)'.format('total', total, 'within' if total <= budget else 'over', budget), file=file)
@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from fractions import Fraction
+
+import cv2
+import numpy as np
+
+# Decoders: 'opencv' (cv2.VideoCapture), 'pyav' (FFmpeg via PyAV, multi-threaded), 'ffmpeg' (raw pipe from the ffmpeg binary)
+READER_BACKENDS = ('opencv', 'pyav', 'ffmpeg')
+# Encoders: 'opencv' (cv2.VideoWriter, mp4v), 'pyav' (H.264 via PyAV), 'ffmpeg' (raw pipe into the ffmpeg binary, H.264)
+WRITER_BACKENDS = ('opencv', 'pyav', 'ffmpeg')
+
+
+def _import_av():
+    try:
+        import av
+    except ImportError:
+        raise ImportError("The 'pyav' backend needs PyAV: pip install av")
+    return av
+
+
+class OpenCVReader:
+    # cv2.VideoCapture with the properties used by the scripts
+
+    def __init__(self, path, threads=0):
+        self.cap = cv2.VideoCapture(path)
+        if threads:
+            self.cap.set(cv2.CAP_PROP_N_THREADS, threads)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        return self.cap.read(image)
+
+    def release(self):
+        self.cap.release()
+
+
+# Counterclockwise display rotation (degrees) -> cv2.rotate code that undoes it, as ffmpeg and OpenCV do
+_ROTATE_CODES = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_CLOCKWISE}
+
+
+class PyAVReader:
+    # FFmpeg decoding through PyAV; thread_count=0 lets FFmpeg pick the number of threads
+
+    def __init__(self, path, threads=0):
+        av = _import_av()
+        self.container = av.open(path)
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = 'AUTO'
+        self.stream.thread_count = threads
+        self.fps = float(self.stream.average_rate or 0)
+        self.frame_count = self.stream.frames
+        self.frames = self.container.decode(self.stream)
+
+        # The rotation is side data of the decoded frames, so the first frame is decoded here
+        self.pending = next(self.frames, None)
+        self.rotation = self.pending.rotation % 360 if self.pending is not None else 0
+        self.frame_width = self.stream.codec_context.width
+        self.frame_height = self.stream.codec_context.height
+        if self.rotation in (90, 270):
+            self.frame_width, self.frame_height = self.frame_height, self.frame_width
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def read(self, image=None):
+        if self.frames is None:
+            return False, None
+        frame, self.pending = self.pending, None
+        if frame is None:
+            try:
+                frame = next(self.frames)
+            except StopIteration:
+                return False, None
+        bgr = frame.to_ndarray(format='bgr24')
+        if image is None or image.shape != (self.frame_height, self.frame_width, 3):
+            image = None
+        if self.rotation in _ROTATE_CODES:
+            return True, cv2.rotate(bgr, _ROTATE_CODES[self.rotation], dst=image)
+        if image is not None:
+            image[...] = bgr
+            return True, image
+        return True, bgr
+
+    def release(self):
+        self.frames = None
+        self.pending = None
+        self.container.close()
+
+
+def probe_video(path, ffmpeg='ffmpeg'):
+    # (fps, width, height, frame_count) of the first video stream from ffprobe (next to the ffmpeg binary),
+    # as ffmpeg decodes it: width and height are swapped for videos with a 90 degree rotation
+    ffprobe = os.path.join(os.path.dirname(ffmpeg), os.path.basename(ffmpeg).replace('ffmpeg', 'ffprobe'))
+    command = [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-of', 'json',
+               '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,nb_frames:stream_tags=rotate:stream_side_data=rotation', path]
+    result = subprocess.run(command, capture_output=True, text=True)
+    streams = json.loads(result.stdout or '{}').get('streams') if result.returncode == 0 else None
+    if not streams:
+        raise OSError('ffprobe found no video stream in {}: {}'.format(path, result.stderr.strip()))
+    stream = streams[0]
+
+    fps = 0.0
+    for rate in (stream.get('avg_frame_rate'), stream.get('r_frame_rate')):
+        if rate and not rate.endswith('/0'):
+            fps = float(Fraction(rate))
+            break
+    rotation = int(float(stream.get('tags', {}).get('rotate', 0)))
+    for side_data in stream.get('side_data_list', []):
+        rotation = int(float(side_data.get('rotation', rotation)))
+    width, height = stream['width'], stream['height']
+    if rotation % 180:
+        width, height = height, width
+    frame_count = int(stream['nb_frames']) if str(stream.get('nb_frames', '')).isdigit() else 0
+    return fps, width, height, frame_count
+
+
+class FFmpegReader:
+    # Decodes with the ffmpeg binary and reads raw BGR frames from its stdout
+
+    def __init__(self, path, threads=0, ffmpeg='ffmpeg'):
+        # Stream properties from ffprobe (no decoding), so the frame size matches what ffmpeg outputs
+        self.fps, self.frame_width, self.frame_height, self.frame_count = probe_video(path, ffmpeg)
+        self.frame_size = self.frame_width * self.frame_height * 3
+        command = [ffmpeg, '-loglevel', 'error', '-threads', str(threads), '-i', path,
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=self.frame_size)
+
+    def isOpened(self):
+        return self.process is not None
+
+    def read(self, image=None):
+        if image is None or image.shape != (self.frame_height, self.frame_width, 3):
+            image = np.empty((self.frame_height, self.frame_width, 3), np.uint8)
+        if self.process is None or self.process.stdout.readinto(memoryview(image).cast('B')) != self.frame_size:
+            return False, None
+        return True, image
+
+    def release(self):
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+
+class OpenCVWriter:
+
+    def __init__(self, path, fps, frame_size, fourcc='mp4v', **options):
+        self.out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+
+    def write(self, frame):
+        self.out.write(frame)
+
+    def release(self):
+        self.out.release()
+
+
+class PyAVWriter:
+    # H.264 through PyAV; preset and crf trade speed against file size
+
+    def __init__(self, path, fps, frame_size, codec='libx264', preset='veryfast', crf=23, threads=0):
+        av = _import_av()
+        self.container = av.open(path, mode='w')
+        self.stream = self.container.add_stream(codec, rate=Fraction(fps or 30).limit_denominator(1001))
+        self.stream.width, self.stream.height = frame_size
+        self.stream.pix_fmt = 'yuv420p'
+        self.stream.thread_type = 'AUTO'
+        self.stream.thread_count = threads
+        self.stream.options = {'preset': preset, 'crf': str(crf)}
+        self.frame_type = av.VideoFrame
+
+    def write(self, frame):
+        for packet in self.stream.encode(self.frame_type.from_ndarray(frame, format='bgr24')):
+            self.container.mux(packet)
+
+    def release(self):
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+
+class FFmpegWriter:
+    # Pipes raw BGR frames into the ffmpeg binary (H.264 by default)
+
+    def __init__(self, path, fps, frame_size, codec='libx264', preset='veryfast', crf=23, threads=0, ffmpeg='ffmpeg'):
+        width, height = frame_size
+        command = [ffmpeg, '-loglevel', 'error', '-y',
+                   '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', '{}x{}'.format(width, height), '-r', str(fps or 30), '-i', '-',
+                   '-c:v', codec, '-preset', preset, '-crf', str(crf), '-threads', str(threads), '-pix_fmt', 'yuv420p', path]
+        # Errors go to a temporary file: a stderr pipe nobody reads could block ffmpeg
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.stderr)
+
+    def write(self, frame):
+        self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+
+    def release(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg already exited, its return code tells why
+            pass
+        returncode = self.process.wait()
+        self.stderr.seek(0)
+        errors = self.stderr.read().decode(errors='replace').strip()
+        self.stderr.close()
+        if returncode != 0:
+            raise OSError('ffmpeg exited with code {}: {}'.format(returncode, errors))
+
+
+def open_reader(path, backend='opencv', threads=0, **options):
+    readers = {'opencv': OpenCVReader, 'pyav': PyAVReader, 'ffmpeg': FFmpegReader}
+    if backend not in readers:
+        raise ValueError('Unknown reader backend {!r}, expected one of {}'.format(backend, READER_BACKENDS))
+    return readers[backend](path, threads=threads, **options)
+
+
+def open_writer(path, fps, frame_size, backend='opencv', **options):
+    # options: fourcc (opencv); codec, preset, crf, threads (pyav, ffmpeg); ffmpeg binary (ffmpeg)
+    writers = {'opencv': OpenCVWriter, 'pyav': PyAVWriter, 'ffmpeg': FFmpegWriter}
+    if backend not in writers:
+        raise ValueError('Unknown writer backend {!r}, expected one of {}'.format(backend, WRITER_BACKENDS))
+    return writers[backend](path, fps, frame_size, **options)
+
+
+def benchmark(input_video_path, output_dir, readers=READER_BACKENDS, writers=WRITER_BACKENDS, n_frames=300, threads=0, preset='veryfast', ffmpeg='ffmpeg'):
+    # Decode and encode fps per backend (CPU only)
+    results = {'decode': {}, 'encode': {}}
+    frames = None
+    reference_backend = None
+    for backend in readers:
+        try:
+            reader = open_reader(input_video_path, backend, threads=threads, **({'ffmpeg': ffmpeg} if backend == 'ffmpeg' else {}))
+        except (ImportError, OSError) as e:
+            print('{} reader: skipped ({})'.format(backend, e))
+            continue
+        # Only the first backend keeps its frames (reference for the others and input of the encoders);
+        # the others decode into one reused buffer and are compared frame by frame
+        keep = not frames
+        decoded = []
+        n_decoded = 0
+        max_difference = 0
+        frame = None
+        elapsed = 0.0
+        while n_decoded < n_frames:
+            start = time.perf_counter()
+            ret, frame = reader.read(None if keep else frame)
+            elapsed += time.perf_counter() - start
+            if not ret:
+                break
+            if keep:
+                decoded.append(frame)
+            elif n_decoded < len(frames):
+                reference = frames[n_decoded]
+                difference = int(cv2.absdiff(frame, reference).max()) if frame.shape == reference.shape else 255
+                max_difference = max(max_difference, difference)
+            n_decoded += 1
+        reader.release()
+        results['decode'][backend] = n_decoded / elapsed if elapsed else 0.0
+        if keep:
+            frames, reference_backend = decoded, backend
+            print('{} reader: {} frames at {:.1f} fps'.format(backend, n_decoded, results['decode'][backend]))
+        else:
+            print('{} reader: {} frames at {:.1f} fps (max pixel difference to {}: {})'.format(
+                backend, n_decoded, results['decode'][backend], reference_backend, max_difference))
+
+    if not frames:
+        return results
+    for backend in writers:
+        path = os.path.join(output_dir, 'benchmark_{}.mp4'.format(backend))
+        options = {} if backend == 'opencv' else {'threads': threads, 'preset': preset}
+        if backend == 'ffmpeg':
+            options['ffmpeg'] = ffmpeg
+        try:
+            writer = open_writer(path, 30, (frames[0].shape[1], frames[0].shape[0]), backend, **options)
+        except (ImportError, OSError) as e:
+            print('{} writer: skipped ({})'.format(backend, e))
+            continue
+        start = time.perf_counter()
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        elapsed = time.perf_counter() - start
+        results['encode'][backend] = len(frames) / elapsed
+        print('{} writer: {} frames at {:.1f} fps, {:.1f} MB'.format(backend, len(frames), results['encode'][backend], os.path.getsize(path) / 1e6))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark decode and encode fps of the video I/O backends.')
+    parser.add_argument('input', help='input video')
+    parser.add_argument('output_dir', help='directory for the encoded test files')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=0, help='decoder/encoder threads (0: automatic)')
+    parser.add_argument('--preset', default='veryfast', help='x264 preset for the pyav and ffmpeg writers')
+    parser.add_argument('--ffmpeg', default='ffmpeg', help='ffmpeg binary for the ffmpeg backend')
+    args = parser.parse_args()
+
+    benchmark(args.input, args.output_dir, n_frames=args.frames, threads=args.threads, preset=args.preset, ffmpeg=args.ffmpeg)
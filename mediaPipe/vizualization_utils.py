@@ -4,8 +4,11 @@ from mediapipe import solutions
 from mediapipe.framework.formats import landmark_pb2
 import numpy as np
 
+from pose_drawing import POSE_CONNECTIONS, POSE_LANDMARK_COLORS, draw_pose
+from pose_engine import tasks_landmarks_to_array
 
-def draw_landmarks_on_image(rgb_image, detection_result):
+
+def draw_landmarks_on_image(rgb_image, detection_result, use_protobuf=True):
   pose_landmarks_list = detection_result.pose_landmarks
   annotated_image = np.copy(rgb_image)
 
@@ -13,6 +16,14 @@ def draw_landmarks_on_image(rgb_image, detection_result):
   for idx in range(len(pose_landmarks_list)):
     pose_landmarks = pose_landmarks_list[idx]
 
+    if not use_protobuf:
+      # Vectorized drawing straight from a (33, 4) array, without building a NormalizedLandmarkList.
+      # Same style as below; no visibility threshold, the protobuf below carries no visibility either
+      landmarks = tasks_landmarks_to_array([pose_landmarks])
+      draw_pose(annotated_image, landmarks, POSE_CONNECTIONS, landmark_color=POSE_LANDMARK_COLORS, connection_color=(224, 224, 224),
+                thickness=2, circle_radius=2, landmark_border=True, clip_to_image=True)
+      continue
+
     # Draw the pose landmarks.
     pose_landmarks_proto = landmark_pb2.NormalizedLandmarkList()
     pose_landmarks_proto.landmark.extend([